@@ -1,70 +1,44 @@
-import numpy as np
-import cv2 as cv
-import glob
-
-
-chessboardSize = (8, 6)
+'''
+    Calibrates the camera from chessboard images and writes the calibration
+    file loaded by the Software at startup.
 
-# termination criteria
-criteria = (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+    Usage:
+        python calibrate_camera.py [--images "./calibration/*.jpg"] [--output ./calibration/calibration.npz] [--preview]
 
-# prepare object points, like (0,0,0), (1,0,0), (2,0,0) ....,(6,5,0)
-objp = np.zeros((chessboardSize[0] * chessboardSize[1] ,3), np.float32)
-objp[:,:2] = np.mgrid[0:chessboardSize[0], 0:chessboardSize[1]].T.reshape(-1,2)
+    Copy the output to Software/calibration/ (settings.calibration_file).
+'''
+import argparse
+import os
+import sys
 
-# Arrays to store object points and image points from all the images.
-objpoints = [] # 3d point in real world space
-imgpoints = [] # 2d points in image plane.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Software'))
 
-images = glob.glob('./calibration/*.jpg')
-
-for fname in images:
-    img = cv.imread(fname)
-    gray = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
-    # Find the chess board corners
-    ret, corners = cv.findChessboardCornersSB(gray, chessboardSize, cv.CALIB_CB_ADAPTIVE_THRESH + cv.CALIB_CB_FAST_CHECK + cv.CALIB_CB_NORMALIZE_IMAGE)
-    # If found, add object points, image points (after refining them)
-
-    if ret == True:
-        objpoints.append(objp)
-        corners2 = cv.cornerSubPix(gray,corners, (11,11), (-1,-1), criteria)
-        imgpoints.append(corners2)
+from Camera.calibrated import CalibratedCamera
+import cv2 as cv
+import glob
 
-        # Draw and display the corners
-        cv.drawChessboardCorners(img, chessboardSize, corners2, ret)
-        # cv.imshow('img', img)
-        # cv.waitKey(500)
-cv.destroyAllWindows()
 
-ret, mtx, dist, rvecs, tvecs = cv.calibrateCamera(objpoints, imgpoints, gray.shape[::-1], None, None)
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', default='./calibration/*.jpg', help='glob of chessboard images')
+    parser.add_argument('--output', default='./calibration/calibration.npz')
+    parser.add_argument('--preview', action='store_true', help='write undistorted samples to ./calibration/result/')
+    args = parser.parse_args()
 
-img = cv.imread('./calibration/capture1.jpg')
-h, w = img.shape[:2]
-newcameramtx, roi = cv.getOptimalNewCameraMatrix(mtx, dist, (w,h), 0, (w,h))
+    paths = sorted(glob.glob(args.images))
+    camera = CalibratedCamera(images=args.images, file=args.output)
+    camera.calibrate(paths)
+    camera.save(CalibratedCamera.images_hash(paths))
 
+    print(f'{len(camera.objpoints)}/{len(paths)} images used')
+    print("total error: {}".format(camera.reprojection_error()))
+    print(f'saved {args.output}')
 
-# undistort
-dst = cv.undistort(img, mtx, dist, None, newcameramtx)
-# crop the image
-x, y, w, h = roi
-dst = dst[y:y+h, x:x+w]
-cv.imwrite('./calibration/result/calibresult1.png', dst)
-cv.imshow('img', dst)
-cv.waitKey(1000)
+    if args.preview:
+        os.makedirs('./calibration/result', exist_ok=True)
+        img = cv.resize(cv.imread(paths[0]), (camera.cam_width, camera.cam_height))
+        cv.imwrite('./calibration/result/calibresult.png', camera.undistort(img))
 
-# undistort
-mapx, mapy = cv.initUndistortRectifyMap(mtx, dist, None, newcameramtx, (w,h), 5)
-dst = cv.remap(img, mapx, mapy, cv.INTER_LINEAR)
-# crop the image
-x, y, w, h = roi
-dst = dst[y:y+h, x:x+w]
-cv.imwrite('./calibration/result/calibresult2.png', dst)
-cv.imshow('img', dst)
-cv.waitKey(1000)
 
-mean_error = 0
-for i in range(len(objpoints)):
-    imgpoints2, _ = cv.projectPoints(objpoints[i], rvecs[i], tvecs[i], mtx, dist)
-    error = cv.norm(imgpoints[i], imgpoints2, cv.NORM_L2)/len(imgpoints2)
-    mean_error += error
-print( "total error: {}".format(mean_error/len(objpoints)) )
\ No newline at end of file
+if __name__ == '__main__':
+    main()
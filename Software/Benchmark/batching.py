@@ -0,0 +1,58 @@
+'''
+    Inference throughput of Camera.inference.InferenceService per batch size.
+
+    Usage (from ./Software):
+        python -m Benchmark.batching [--backend keras] [--requests 256] [--batch-sizes 1 8 32]
+
+    Every request is submitted at once from several client threads, as the
+    recorder and offline scripts would, and the service is left to coalesce them.
+'''
+from concurrent.futures import ThreadPoolExecutor
+from Camera import inference
+from Config import settings
+import argparse
+import time
+import numpy as np
+
+
+def run(backend, batch_size:int, requests:int, clients:int, images:np.ndarray) -> dict:
+    service = inference.InferenceService(backend, max_batch_size=batch_size, max_latency=settings.max_batch_latency)
+    service.submit(images[0]).result() # warm up
+    service.batch_sizes.clear()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        futures = [pool.submit(lambda i: service.submit(images[i % len(images)]).result(), i) for i in range(requests)]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+    service.close()
+
+    return {
+        'images_per_second': requests / elapsed,
+        'mean_batch': float(np.mean(service.batch_sizes)),
+        'batches': len(service.batch_sizes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=list(inference.BACKENDS), default=settings.inference_backend)
+    parser.add_argument('--requests', type=int, default=256)
+    parser.add_argument('--clients', type=int, default=32, help='threads submitting requests')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+    args = parser.parse_args()
+
+    backend = inference.load_backend(args.backend)
+    rng = np.random.default_rng(0)
+    images = rng.uniform(0, 255, (8, *settings.IMAGE_SHAPE)).astype(np.float32)
+
+    print(f'backend: {backend}')
+    print(f'{"max batch":>9} {"images/s":>10} {"mean batch":>11} {"batches":>8}')
+    for batch_size in args.batch_sizes:
+        r = run(backend, batch_size, args.requests, args.clients, images)
+        print(f'{batch_size:>9} {r["images_per_second"]:>10.1f} {r["mean_batch"]:>11.1f} {r["batches"]:>8}')
+
+
+if __name__ == '__main__':
+    main()
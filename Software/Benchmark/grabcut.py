@@ -0,0 +1,84 @@
+'''
+    Foreground extraction: legacy full-resolution GrabCut vs. Camera.foreground_extraction
+
+    Usage (from ./Software):
+        python -m Benchmark.grabcut [--images "./testImages/*.jpg"] [--runs 3] [--selection 0.8]
+
+    The selection is a centered rectangle covering --selection of each side.
+    IoU is measured against the legacy mask. The incremental extractor is kept
+    across images, as across consecutive captures; its first image is a full solve.
+'''
+from Camera import foreground_extraction as forex
+import argparse
+import glob
+import sys
+import time
+import numpy as np
+import cv2
+
+
+def legacy_grabcut(image, rect, iterations=5) -> np.ndarray:
+    ''' GrabCut.begin before the downscaled solve: the whole frame at full resolution '''
+    mask = np.zeros(image.shape[:2], np.uint8)
+    background_model = np.zeros((1, 65), np.float64)
+    foreground_model = np.zeros((1, 65), np.float64)
+    cv2.grabCut(image, mask, rect, background_model, foreground_model, iterations, cv2.GC_INIT_WITH_RECT)
+    return np.where((mask == cv2.GC_PR_BGD) | (mask == cv2.GC_BGD), 0, 255).astype(np.uint8)
+
+
+def iou(a:np.ndarray, b:np.ndarray) -> float:
+    union = np.count_nonzero(a | b)
+    return np.count_nonzero(a & b) / union if union else 1.0
+
+
+def measure(fn, image, rect, runs:int) -> tuple:
+    ''' :returns: (mask, median ms) '''
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        mask = fn(image, rect)
+        times.append(time.perf_counter() - start)
+    return mask, 1000 * float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', default='./testImages/*.jpg')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--selection', type=float, default=0.8)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.images))
+    if not paths:
+        sys.exit(f'No images match {args.images}')
+
+    fast = forex.GrabCut(incremental=False)
+    fast.refine = False
+    refined = forex.GrabCut(incremental=False)
+    refined.refine = True
+    incremental = forex.GrabCut(incremental=True)
+    methods = {
+        'legacy': legacy_grabcut,
+        'downscaled': fast.extract,
+        'downscaled+refine': refined.extract,
+        'incremental': incremental.extract,
+        'threshold': forex.LeafThreshold().extract,
+    }
+
+    print(f'{"image":<28} {"method":<18} {"ms":>9} {"IoU":>6}')
+    for path in paths:
+        image = cv2.imread(path, cv2.IMREAD_COLOR) # BGR, as captured
+        h, w = image.shape[:2]
+        rw, rh = int(w * args.selection), int(h * args.selection)
+        rect = ((w - rw) // 2, (h - rh) // 2, rw, rh)
+
+        reference = None
+        for name, fn in methods.items():
+            mask, ms = measure(fn, image, rect, args.runs)
+            if reference is None:
+                reference = mask > 0
+            print(f'{path[-28:]:<28} {name:<18} {ms:>9.1f} {iou(mask > 0, reference):>6.3f}')
+
+
+if __name__ == '__main__':
+    main()
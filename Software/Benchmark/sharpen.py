@@ -0,0 +1,76 @@
+'''
+    Unsharp mask: legacy float64 implementation vs. Camera.enhance.UnsharpMask
+
+    Usage (from ./Software):
+        python -m Benchmark.sharpen [--frames 200]
+'''
+from Camera.enhance import UnsharpMask
+import argparse
+import time
+import tracemalloc
+import numpy as np
+import cv2
+
+RESOLUTIONS = {
+    '640x480': (480, 640, 3),
+    '1080p': (1080, 1920, 3),
+}
+
+
+def legacy_sharp_mask(image, kernel_size=(5, 5), sigma=1.0, amount=1.0, threshold=0):
+    ''' Recorder.sharp_mask before the uint8 rewrite '''
+    blurred = cv2.GaussianBlur(image, kernel_size, sigma)
+    sharpened = float(amount + 1) * image - float(amount) * blurred
+    sharpened = np.maximum(sharpened, np.zeros(sharpened.shape))
+    sharpened = np.minimum(sharpened, 255 * np.ones(sharpened.shape))
+    sharpened = sharpened.round().astype(np.uint8)
+    if threshold > 0:
+        low_contrast_mask = np.absolute(image - blurred) < threshold
+        np.copyto(sharpened, image, where=low_contrast_mask)
+    return sharpened
+
+
+def measure(fn, frame, n_frames:int) -> dict:
+    fn(frame) # warm up (and let UnsharpMask allocate its buffers)
+
+    start = time.perf_counter()
+    for _ in range(n_frames):
+        fn(frame)
+    elapsed = time.perf_counter() - start
+
+    # numpy reports its buffers to tracemalloc; count frame sized blocks
+    tracemalloc.start()
+    fn(frame)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'ms_per_frame': 1000 * elapsed / n_frames,
+        'peak_bytes': peak,
+        'frame_allocations': peak / frame.nbytes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--amount', type=float, default=1.0)
+    args = parser.parse_args()
+
+    unsharp = UnsharpMask()
+    rng = np.random.default_rng(0)
+
+    print(f'{"resolution":<10} {"implementation":<14} {"ms/frame":>9} {"peak MiB":>9} {"frame allocs":>13}')
+    for name, shape in RESOLUTIONS.items():
+        frame = rng.integers(0, 256, shape, dtype=np.uint8)
+        for label, fn in (
+            ('legacy', lambda f: legacy_sharp_mask(f, amount=args.amount)),
+            ('uint8', lambda f: unsharp.apply(f, amount=args.amount)),
+            ('uint8 (0)', lambda f: unsharp.apply(f, amount=0)),
+        ):
+            r = measure(fn, frame, args.frames)
+            print(f'{name:<10} {label:<14} {r["ms_per_frame"]:>9.3f} {r["peak_bytes"] / 2**20:>9.2f} {r["frame_allocations"]:>13.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+'''
+    Capture-to-result benchmark of the recorder pipeline, no camera or display needed.
+
+    Usage (from ./Software):
+        python -m Benchmark.suite [--source both] [--frames 300] [--compare Benchmark/results/<old>.json]
+        python -m Benchmark.suite --replay ./recordings/field-01.mp4
+
+    Synthetic frames and/or ./testImages (resized to the camera resolution) go
+    through each Recorder stage on its own (production code, called directly)
+    and through the whole threaded pipeline. Every benchmark reports throughput,
+    latency percentiles and the peak RSS of the process so far; the results and
+    the per-step breakdown of Utils.timing are written as JSON so two commits
+    can be compared with --compare.
+'''
+from PyQt5 import QtCore
+from Camera.recorder import Recorder
+from Camera import foreground_extraction as forex
+from Camera import pipeline
+from Camera import sources as frame_sources
+from Camera.frame import Frame
+from Utils.utils import Project, Analytics, Image
+from Utils import timing
+from Config import settings
+import argparse
+import glob
+import json
+import os
+import platform
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+import cv2
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+FRAME_SHAPE = (480, 640, 3) # settings.camera_scale, as the JINJIEAN B19 delivers it
+
+
+def synthetic_frames(count:int, seed:int=0) -> list:
+    ''' Smoothed noise, textured enough for GrabCut and JPEG to do real work '''
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        noise = rng.integers(0, 256, FRAME_SHAPE, dtype=np.uint8)
+        frames.append(cv2.GaussianBlur(noise, (0, 0), 3))
+    return frames
+
+
+def test_frames(pattern:str) -> list:
+    h, w = FRAME_SHAPE[:2]
+    images = (cv2.imread(path, cv2.IMREAD_COLOR) for path in sorted(glob.glob(pattern)))
+    return [cv2.resize(image, (w, h), interpolation=cv2.INTER_AREA) for image in images if image is not None]
+
+
+def replay_frames(spec:str, limit:int) -> list:
+    ''' Up to `limit` frames of a recording (Camera.sources), resized to the camera resolution '''
+    h, w = FRAME_SHAPE[:2]
+    source = frame_sources.open_source(spec, realtime=False)
+    frames = []
+    if source.open():
+        while len(frames) < limit:
+            ret, frame = source.read()
+            if ret:
+                frames.append(cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA))
+            elif source.finished:
+                break
+    source.release()
+    return frames
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10 # bytes on macOS, KiB elsewhere
+
+
+def stats(latencies:list, elapsed:float) -> dict:
+    ms = np.asarray(latencies) * 1000
+    return {
+        'count': len(latencies),
+        'per_second': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def measure(fn, frames:list, runs:int) -> dict:
+    ''' Calls fn(frame) `runs` times, cycling through frames, after one warm-up call '''
+    fn(frames[0])
+    latencies = []
+    start = time.perf_counter()
+    for i in range(runs):
+        t = time.perf_counter()
+        fn(frames[i % len(frames)])
+        latencies.append(time.perf_counter() - t)
+    return stats(latencies, time.perf_counter() - start)
+
+
+class HeadlessUI:
+    ''' What the recorder stages read from Widgets.ui.UI, without widgets '''
+
+    class Checkbox:
+        def __init__(self, checked:bool) -> None:
+            self.checked = checked
+
+        def isChecked(self) -> bool:
+            return self.checked
+
+    class Rect:
+        def getRect(self) -> tuple:
+            w, h = settings.camera_scale[:2]
+            return (w // 4, h // 4, w // 2, h // 2)
+
+    class Results:
+        ''' Stands in for UI.recorder_results, sets `event` on every result '''
+        def __init__(self) -> None:
+            self.event = threading.Event()
+
+        def emit(self, result:dict) -> None:
+            self.event.set()
+
+    def __init__(self, project_path:str, grabcut:bool=False) -> None:
+        self.grabcut_checkbox = self.Checkbox(grabcut)
+        self.resizableRect = self.Rect()
+        self.analytics = Analytics(path=project_path)
+        self.recorder_results = self.Results()
+
+
+def new_recorder(project_path:str, grabcut:bool=False) -> Recorder:
+    recorder = Recorder(selectedPath=project_path)
+    recorder.parent = HeadlessUI(project_path, grabcut=grabcut)
+    # stands in for UI.setImage, which releases the preview buffer once shown
+    recorder.changePixmap.connect(lambda image: recorder.previewDone(), QtCore.Qt.DirectConnection)
+    # UI.set_controls_to_default(), sharpening is benchmarked separately
+    recorder.brightnessValue, recorder.contrastValue, recorder.sharpnessValue = 0, 1.0, 0
+    return recorder
+
+
+def new_image() -> Image:
+    today = Analytics.get_clock()
+    return Image(
+        id = Analytics.create_new_id(),
+        path = '',
+        classification = settings.class_names[0],
+        confidence = 0.9,
+        tensor_shape = settings.IMAGE_SHAPE,
+        type = settings.f_extension,
+        created = today,
+        modified = today
+    )
+
+
+def bench_stages(recorder:Recorder, frames:list, runs:int, grabcut_runs:int, has_model:bool, has_calibration:bool) -> dict:
+    results = {}
+    rect = recorder.parent.resizableRect.getRect()
+
+    def preprocess(**values):
+        def run(frame):
+            for name, value in values.items():
+                setattr(recorder, name, value)
+            recorder.preprocess(frame)
+        return run
+
+    results['preprocess'] = measure(preprocess(), frames, runs)
+    results['preprocess+sharpen'] = measure(preprocess(sharpnessValue=1.0), frames, runs)
+    results['preprocess+zoom'] = measure(preprocess(sharpnessValue=0, scaleValue=0.8), frames, runs)
+    if has_calibration:
+        results['preprocess+undistort'] = measure(preprocess(scaleValue=1, defisheyeValue=True), frames, runs)
+    recorder.defisheyeValue = False
+
+    results['grabcut'] = measure(lambda frame: forex.GrabCut().begin(image=frame.copy(), rect=rect), frames, grabcut_runs)
+
+    if has_model:
+        results['inference'] = measure(
+            lambda frame: recorder.infer(pipeline.Capture(frame=Frame(frame), grabcut=False, rect=rect)), frames, runs
+        )
+
+    def persist(frame):
+        capture = pipeline.Capture(frame=Frame(frame), grabcut=False, rect=rect, classification=settings.class_names[0], confidence=0.9)
+        capture.image = new_image()
+        recorder.persist(capture)
+        recorder.writer.flush() # until the file is written and synced
+    results['persist'] = measure(persist, frames, runs)
+
+    results['analytics'] = measure(lambda frame: recorder.parent.analytics.add_image(new_image()), frames, runs)
+    return results
+
+
+def bench_pipeline(recorder:Recorder, frames:list, runs:int, captures:int, has_model:bool) -> dict:
+    ''' Preview throughput with frames handed over as fast as preprocessing takes them, then capture-to-result latency '''
+    results = {}
+    recorder.sharpnessValue, recorder.scaleValue, recorder.defisheyeValue = 1.0, 1, False
+    recorder.pipeline.start()
+    try:
+        ticks = timing.registry.count('frame')
+        recorder.frames.dropped = 0
+        start = time.perf_counter()
+        for i in range(runs):
+            # blocking put: waits for the slot instead of replacing the frame in it, nothing is dropped
+            queue.Queue.put(recorder.frames, frames[i % len(frames)])
+        # until the last frame is shown, not merely taken from the queue
+        deadline = time.monotonic() + 60
+        while timing.registry.count('frame') - ticks < runs and time.monotonic() < deadline:
+            time.sleep(0.001)
+        elapsed = time.perf_counter() - start
+        shown = timing.registry.count('frame') - ticks
+        if shown < runs:
+            print(f'pipeline: {shown} of {runs} frames shown within 60 s')
+        results['pipeline:preview'] = {
+            'count': runs,
+            'per_second': shown / elapsed,
+            'dropped': recorder.frames.dropped,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+
+        if has_model:
+            done = recorder.parent.recorder_results.event
+            latencies = []
+            start = time.perf_counter()
+            for i in range(captures):
+                done.clear()
+                t = time.perf_counter()
+                recorder.doCaptureValue = True
+                recorder.frames.put(frames[i % len(frames)])
+                if not done.wait(timeout=60):
+                    print('pipeline: no result within 60 s, stopping')
+                    break
+                latencies.append(time.perf_counter() - t)
+            if latencies:
+                results['pipeline:capture'] = stats(latencies, time.perf_counter() - start)
+    finally:
+        recorder.pipeline.stop()
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old:dict, new:dict) -> None:
+    print(f'\nvs {old.get("commit")} ({old.get("created")}):')
+    for name, result in new['benchmarks'].items():
+        before = old['benchmarks'].get(name)
+        if before is None:
+            continue
+        line = f'    {name:<22}'
+        if 'p50_ms' in result and 'p50_ms' in before:
+            line += f' p50 {before["p50_ms"]:8.2f} -> {result["p50_ms"]:8.2f} ms ({(result["p50_ms"] / before["p50_ms"] - 1) * 100:+6.1f}%)'
+        if before.get('per_second'):
+            line += f'  {(result["per_second"] / before["per_second"] - 1) * 100:+6.1f}% throughput'
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', choices=['synthetic', 'testImages', 'both'], default='both')
+    parser.add_argument('--images', default='./testImages/*.jpg')
+    parser.add_argument('--replay', help='also benchmark the frames of a video file or image directory')
+    parser.add_argument('--replay-frames', type=int, default=100, help='frames kept in memory from --replay')
+    parser.add_argument('--frames', type=int, default=300, help='calls per stage and frames pushed through the pipeline')
+    parser.add_argument('--grabcut-runs', type=int, default=10)
+    parser.add_argument('--captures', type=int, default=20, help='captures timed through the whole pipeline')
+    parser.add_argument('--output', help='JSON file (default: ./Benchmark/results/<commit>.json)')
+    parser.add_argument('--compare', help='earlier JSON result to compare against')
+    args = parser.parse_args()
+
+    app = QtCore.QCoreApplication(sys.argv) # signals and QImage, no display
+
+    sources = {}
+    if args.source in ('synthetic', 'both'):
+        sources['synthetic'] = synthetic_frames(8)
+    if args.source in ('testImages', 'both'):
+        sources['testImages'] = test_frames(args.images)
+        if not sources['testImages']:
+            print(f'No images match {args.images}, skipped')
+            del sources['testImages']
+    if args.replay:
+        sources['replay'] = replay_frames(args.replay, args.replay_frames)
+        if not sources['replay']:
+            print(f'Cannot read {args.replay}, skipped')
+            del sources['replay']
+    if not sources:
+        sys.exit('No frames to benchmark')
+
+    try:
+        backend = Recorder.backend.get()
+        has_model = True
+        print(f'model: {backend}')
+    except Exception as e:
+        has_model = False
+        print(f'model unavailable ({e}), inference and captures are skipped')
+
+    try:
+        Recorder.calibrated_camera.get()
+        has_calibration = True
+    except Exception as e:
+        has_calibration = False
+        print(f'calibration unavailable ({e}), undistortion is skipped')
+
+    benchmarks = {}
+    with tempfile.TemporaryDirectory() as project_path:
+        Project.mkNewProject(project_path)
+        for source, frames in sources.items():
+            print(f'{source}: {len(frames)} frames of {FRAME_SHAPE}')
+            recorder = new_recorder(project_path)
+            results = bench_stages(recorder, frames, args.frames, args.grabcut_runs, has_model, has_calibration)
+            results.update(bench_pipeline(recorder, frames, args.frames, args.captures, has_model))
+            recorder.service.close()
+            recorder.writer.close()
+            for name, result in results.items():
+                benchmarks[f'{source}/{name}'] = result
+
+    report = {
+        'commit': git_commit(),
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'backend': settings.inference_backend if has_model else None,
+        'benchmarks': benchmarks,
+        'steps': timing.registry.summary(),
+    }
+
+    print(f'\n{"benchmark":<34} {"per s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"RSS MB":>8}')
+    for name, r in benchmarks.items():
+        percentiles = ''.join(f' {r[k]:>8.2f}' if k in r else f' {"-":>8}' for k in ('p50_ms', 'p95_ms', 'p99_ms'))
+        rss = f'{r["peak_rss_mb"]:>8.0f}' if r['peak_rss_mb'] is not None else f'{"-":>8}'
+        print(f'{name:<34} {r["per_second"]:>8.1f}{percentiles} {rss}')
+
+    output = args.output or os.path.join('Benchmark', 'results', f'{report["commit"] or time.strftime("%Y%m%d-%H%M%S")}.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f'\nwritten to {output}')
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,66 @@
 from Config import settings
 import numpy as np
 import cv2 as cv
+import collections
 import glob
+import hashlib
+import os
 
 class CalibratedCamera:
-    ''' JINJIEAN B19 FPV Mini Camera '''
+    '''
+        JINJIEAN B19 FPV Mini Camera
+
+        The calibration is cached in `settings.calibration_file` together with a
+        hash of the chessboard images it was computed from, so the chessboard
+        detection only runs again when those images change.
+    '''
     chessboardSize = (8, 6)
     criteria = (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 30, 0.001)
     ret = mtx = dist = rvecs = tvecs = None
     newcameramtx = roi = None
+    objpoints = imgpoints = None
     cam_width, cam_height = settings.camera_scale[:2]
+    max_cached_maps = 4 # (resolution, zoom) pairs
+
+    def __init__(self, images:str=settings.calibration_images, file:str=settings.calibration_file) -> None:
+        self.images = images
+        self.file = file
+        self._maps = collections.OrderedDict()
 
     def start(self):
+        paths = sorted(glob.glob(self.images))
+        digest = self.images_hash(paths)
+
+        # without source images (e.g. a deployed copy) trust whatever file is there
+        if self.load(digest=digest if paths else None):
+            return self
+
+        self.calibrate(paths)
+        self.save(digest)
+        return self
+
+    @staticmethod
+    def images_hash(paths:list) -> str:
+        sha = hashlib.sha1()
+        for fname in paths:
+            sha.update(os.path.basename(fname).encode())
+            with open(fname, 'rb') as f:
+                sha.update(f.read())
+        return sha.hexdigest()
+
+    def calibrate(self, paths:list):
+        if not paths:
+            raise FileNotFoundError(f'No calibration images match {self.images}')
+
         # prepare object points, like (0,0,0), (1,0,0), (2,0,0) ....,(6,5,0)
         objp = np.zeros((self.chessboardSize[0] * self.chessboardSize[1] ,3), np.float32)
         objp[:,:2] = np.mgrid[0:self.chessboardSize[0], 0:self.chessboardSize[1]].T.reshape(-1,2)
 
         # Arrays to store object points and image points from all the images.
-        objpoints = [] # 3d point in real world space
-        imgpoints = [] # 2d points in image plane.
+        self.objpoints = [] # 3d point in real world space
+        self.imgpoints = [] # 2d points in image plane.
 
-        images = glob.glob('./calibration/*.jpg')
-
-        for fname in images:
+        for fname in paths:
             img = cv.imread(fname)
             gray = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
             # Find the chess board corners
@@ -34,24 +72,87 @@ class CalibratedCamera:
 
             # If found, add object points, image points (after refining them)
             if ret == True:
-                objpoints.append(objp)
+                self.objpoints.append(objp)
                 corners2 = cv.cornerSubPix(gray,corners, (11,11), (-1,-1), self.criteria)
-                imgpoints.append(corners2)
-
-                # Draw and display the corners
-                cv.drawChessboardCorners(img, self.chessboardSize, corners2, ret)
-                # cv.imshow('img', img)
-                # cv.waitKey(500)
-        cv.destroyAllWindows()
+                self.imgpoints.append(corners2)
 
-        self.ret, self.mtx, self.dist, self.rvecs, self.tvecs = cv.calibrateCamera(objpoints, imgpoints, gray.shape[::-1], None, None)
+        self.ret, self.mtx, self.dist, self.rvecs, self.tvecs = cv.calibrateCamera(self.objpoints, self.imgpoints, gray.shape[::-1], None, None)
         self.newcameramtx, self.roi = cv.getOptimalNewCameraMatrix(self.mtx, self.dist, (self.cam_width,self.cam_height), 0, ((self.cam_width,self.cam_height)))
-
+        self._maps.clear()
         return self
-        
-    def undistort(self, img):
-        dst = cv.undistort(img, self.mtx, self.dist, None, self.newcameramtx)
+
+    def reprojection_error(self) -> float:
+        ''' Mean error of the last calibrate() call '''
+        mean_error = 0
+        for i in range(len(self.objpoints)):
+            imgpoints2, _ = cv.projectPoints(self.objpoints[i], self.rvecs[i], self.tvecs[i], self.mtx, self.dist)
+            mean_error += cv.norm(self.imgpoints[i], imgpoints2, cv.NORM_L2) / len(imgpoints2)
+        return mean_error / len(self.objpoints)
+
+    def save(self, digest:str=''):
+        os.makedirs(os.path.dirname(self.file) or '.', exist_ok=True)
+        # write next to the target then rename, a crash never leaves half a file
+        tmp = f'{self.file}.tmp.npz'
+        np.savez(
+            tmp,
+            mtx = self.mtx,
+            dist = self.dist,
+            newcameramtx = self.newcameramtx,
+            roi = np.asarray(self.roi, np.int32),
+            size = np.asarray((self.cam_width, self.cam_height), np.int32),
+            source_hash = np.asarray(digest),
+        )
+        os.replace(tmp, self.file)
+
+    def load(self, digest:str=None) -> bool:
+        ''' :param digest: reject the file unless it was computed from these images '''
+        try:
+            with np.load(self.file, allow_pickle=False) as data:
+                if digest is not None and str(data['source_hash']) != digest:
+                    return False
+                if tuple(data['size']) != (self.cam_width, self.cam_height):
+                    return False
+                self.mtx = data['mtx']
+                self.dist = data['dist']
+                self.newcameramtx = data['newcameramtx']
+                self.roi = tuple(int(v) for v in data['roi'])
+        except (OSError, KeyError, ValueError):
+            return False
+        self._maps.clear()
+        return True
+
+    def remap_tables(self, size:tuple, scale:float=1.0) -> tuple:
+        '''
+            Fixed point (CV_16SC2) maps that undistort a frame of `size` (w, h),
+            crop it to the ROI and apply the centered zoom crop of the recorder,
+            all in one `cv.remap`. Cached per resolution and zoom.
+        '''
+        key = (tuple(size), round(scale, 2))
+        if key in self._maps:
+            self._maps.move_to_end(key)
+            return self._maps[key]
+
+        mapx, mapy = cv.initUndistortRectifyMap(self.mtx, self.dist, None, self.newcameramtx, tuple(size), cv.CV_32FC1)
+
+        # ROI crop
         x, y, w, h = self.roi
-        dst = dst[y:y+h, x:x+w]
-        return dst
+        mapx, mapy = mapx[y:y+h, x:x+w], mapy[y:y+h, x:x+w]
+
+        # zoom crop, resized back to the ROI size (same arithmetic as the recorder)
+        centerX, centerY = int(h/2), int(w/2)
+        radiusX, radiusY = int(centerX*scale), int(centerY*scale)
+        if radiusX != centerX or radiusY != centerY:
+            mapx = cv.resize(mapx[centerX-radiusX:centerX+radiusX, centerY-radiusY:centerY+radiusY], (w, h))
+            mapy = cv.resize(mapy[centerX-radiusX:centerX+radiusX, centerY-radiusY:centerY+radiusY], (w, h))
+
+        maps = cv.convertMaps(mapx, mapy, cv.CV_16SC2)
+        self._maps[key] = maps
+        if len(self._maps) > self.max_cached_maps:
+            self._maps.popitem(last=False)
+        return maps
 
+    def undistort(self, img, scale:float=1.0):
+        ''' Undistorted ROI of `img`, zoomed by `scale` (1 = no zoom) '''
+        h, w = img.shape[:2]
+        map1, map2 = self.remap_tables((w, h), scale)
+        return cv.remap(img, map1, map2, cv.INTER_LINEAR)
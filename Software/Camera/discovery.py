@@ -0,0 +1,153 @@
+from PyQt5 import QtCore
+from Config import settings
+import os
+import re
+import struct
+import sys
+import threading
+
+import cv2
+
+V4L2_SYSFS = '/sys/class/video4linux'
+VIDIOC_QUERYCAP = 0x80685600 # _IOR('V', 0, struct v4l2_capability), 104 bytes
+V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+V4L2_CAP_DEVICE_CAPS = 0x80000000
+
+
+def read_text(path:str) -> str:
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return ''
+
+
+def v4l2_capabilities(device:str) -> int:
+    ''' Capabilities of the node itself (VIDIOC_QUERYCAP), the device is not streamed '''
+    import fcntl
+    fd = os.open(device, os.O_RDONLY | os.O_NONBLOCK)
+    try:
+        capability = bytearray(104)
+        fcntl.ioctl(fd, VIDIOC_QUERYCAP, capability)
+    finally:
+        os.close(fd)
+    # after driver[16], card[32], bus_info[32] and version
+    capabilities, device_caps = struct.unpack_from('=II', capability, 84)
+    return device_caps if capabilities & V4L2_CAP_DEVICE_CAPS else capabilities
+
+
+def v4l2_cameras() -> dict:
+    ''' Linux: /dev/video<n> capture nodes (a camera also has metadata nodes), n is the cv2.VideoCapture index '''
+    if not os.path.isdir(V4L2_SYSFS):
+        return {}
+
+    cameras = {}
+    for node in os.listdir(V4L2_SYSFS):
+        match = re.fullmatch(r'video(\d+)', node)
+        if match is None:
+            continue
+        try:
+            if not v4l2_capabilities(f'/dev/{node}') & V4L2_CAP_VIDEO_CAPTURE:
+                continue
+        except OSError:
+            # not allowed to query it: the capture node is a device's first one
+            if read_text(os.path.join(V4L2_SYSFS, node, 'index')) not in ('', '0'):
+                continue
+        cameras[int(match.group(1))] = read_text(os.path.join(V4L2_SYSFS, node, 'name')) or node
+    return dict(sorted(cameras.items()))
+
+
+def dshow_cameras() -> dict:
+    ''' Windows: DirectShow video inputs, in the order cv2.VideoCapture numbers them '''
+    import comtypes
+    from pygrabber.dshow_graph import FilterGraph
+    comtypes.CoInitialize() # COM is initialized per thread
+    try:
+        return dict(enumerate(FilterGraph().get_input_devices()))
+    finally:
+        comtypes.CoUninitialize()
+
+
+def probe_cameras(count:int=4) -> dict:
+    ''' Elsewhere: opens the first `count` indices, slow (a capture pipeline each), so listed only once '''
+    cameras = {}
+    for index in range(count):
+        cap = cv2.VideoCapture(index)
+        if cap.isOpened():
+            cameras[index] = f'Camera {index}'
+        cap.release()
+    return cameras
+
+
+# sys.platform -> camera listing, cheap enough to repeat for hot-plug
+BACKENDS = {
+    'linux': v4l2_cameras,
+    'win32': dshow_cameras,
+}
+
+
+def list_cameras() -> dict:
+    ''' cv2.VideoCapture index -> device name '''
+    return BACKENDS.get(sys.platform, probe_cameras)()
+
+
+class CameraDiscovery(QtCore.QObject):
+    '''
+        Lists the cameras on a background thread and keeps the result.
+
+            discovery = CameraDiscovery()
+            discovery.changed.connect(on_cameras) # index -> name, on every change
+            discovery.start()
+            discovery.cameras # the latest list, never blocks
+
+        The cameras are listed again every `interval` seconds, so cameras
+        plugged in or out show up without asking. Platforms without a listing
+        backend are probed once (probe_cameras would open the camera in use).
+    '''
+    changed = QtCore.pyqtSignal(dict)
+
+    def __init__(self, interval:float=settings.camera_discovery_interval, parent=None) -> None:
+        super().__init__(parent)
+        self.cameras = {}
+        self.repeatable = sys.platform in BACKENDS
+        self.listed = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(int((interval or 0) * 1000))
+        self.timer.timeout.connect(self.refresh)
+
+    def start(self) -> None:
+        self.refresh()
+        if self.repeatable and self.timer.interval() > 0:
+            self.timer.start()
+
+    def stop(self) -> None:
+        self.timer.stop()
+
+    def wait(self, timeout=None) -> dict:
+        ''' The cameras once listed the first time, or what is known after `timeout` seconds '''
+        self.listed.wait(timeout)
+        return self.cameras
+
+    def refresh(self) -> None:
+        ''' Lists again in the background, unless a listing is still running '''
+        with self._lock:
+            if self._thread is not None and (self._thread.is_alive() or not self.repeatable):
+                return
+            self._thread = threading.Thread(target=self._list, name='camera discovery', daemon=True)
+            self._thread.start()
+
+    def _list(self) -> None:
+        try:
+            cameras = list_cameras()
+        except Exception as e:
+            print(f'Cannot list the cameras: {e}')
+            cameras = self.cameras
+
+        changed = cameras != self.cameras
+        self.cameras = cameras
+        self.listed.set()
+        if changed:
+            self.changed.emit(cameras) # queued to the GUI thread
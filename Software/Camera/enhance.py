@@ -0,0 +1,52 @@
+import numpy as np
+import cv2
+
+
+class UnsharpMask:
+    '''
+        Unsharp masking on uint8 frames.
+
+        sharpened = (1 + amount) * image - amount * blur(image)
+
+        is computed with a single saturating `cv2.addWeighted`, so frames never
+        get promoted to float64. Scratch buffers are kept per resolution and
+        reused, which means the returned array is overwritten by the next call
+        with the same shape; copy it if it has to outlive the frame.
+    '''
+
+    def __init__(self, kernel_size=(5, 5), sigma=1.0) -> None:
+        self.kernel_size = kernel_size
+        self.sigma = sigma
+        self._buffers = {}
+
+    def _scratch(self, shape:tuple) -> dict:
+        buffers = self._buffers.get(shape)
+        if buffers is None:
+            buffers = {
+                'blurred': np.empty(shape, np.uint8),
+                'sharpened': np.empty(shape, np.uint8),
+                'diff': np.empty(shape, np.uint8),
+                'mask': np.empty((shape[0], int(np.prod(shape[1:]))), np.uint8),
+            }
+            self._buffers[shape] = buffers
+        return buffers
+
+    def apply(self, image:np.ndarray, amount=1.0, threshold=0) -> np.ndarray:
+        if amount == 0:
+            return image
+
+        buffers = self._scratch(image.shape)
+        blurred = cv2.GaussianBlur(image, self.kernel_size, self.sigma, dst=buffers['blurred'])
+        sharpened = cv2.addWeighted(image, 1.0 + amount, blurred, -amount, 0, dst=buffers['sharpened'])
+
+        if threshold > 0:
+            # keep the original pixels where the edge response is too weak,
+            # compared on single channel views so the scalar applies to every channel
+            rows = image.shape[0]
+            diff = cv2.absdiff(image, blurred, dst=buffers['diff'])
+            mask = cv2.compare(diff.reshape(rows, -1), threshold, cv2.CMP_LT, dst=buffers['mask'])
+            cv2.copyTo(image.reshape(rows, -1), mask, sharpened.reshape(rows, -1))
+        return sharpened
+
+    def clear(self) -> None:
+        self._buffers.clear()
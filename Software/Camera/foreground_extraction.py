@@ -1,24 +1,239 @@
+from Config import settings
+from .frame import BGR, RGB
 import numpy as np
 import cv2
 
+# Re-decides the boundary band with the colour models of the downscaled solve,
+# without learning them again (GC_EVAL on OpenCV builds without the freeze mode)
+GC_EVAL_FROZEN = getattr(cv2, 'GC_EVAL_FREEZE_MODEL', cv2.GC_EVAL)
+
+
+def clip_rect(rect:tuple, shape:tuple) -> tuple:
+    ''' (x, y, width, height) limited to an image of `shape`, None when less than 2x2 is left '''
+    x, y, w, h = (int(round(v)) for v in rect)
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, shape[1]), min(y + h, shape[0])
+    if x1 - x0 < 2 or y1 - y0 < 2:
+        return None
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
 class GrabCut:
-    iterations = 5
-    mask = []
-    background_model = np.zeros((1, 65), np.float64)
-    foreground_model = np.zeros((1, 65), np.float64)
+    '''
+        GrabCut foreground extraction inside a selection.
+
+        The graph cut is solved on a crop around the selection (plus `margin`)
+        scaled down to `work_size` pixels, but never below `min_scale` of it:
+        on small solves the colour models lose the leaf's thin dark lesions and
+        the cut collapses. The upsampled mask is then only
+        re-decided at full resolution in a thin band along its boundary, with
+        the colour models of the small solve (`refine`).
+
+        In `incremental` mode the previous capture's colour models and mask
+        seed the next solve (GC_EVAL, `incremental_iterations`), so successive
+        leaves shot on the same background converge much faster. A capture of
+        another frame size starts over, as does reset(). From another thread
+        than the one extracting, use request_reset().
+    '''
+    iterations = settings.grabcut_iterations
+    incremental_iterations = settings.grabcut_incremental_iterations
+    work_size = settings.grabcut_work_size
+    min_scale = settings.grabcut_min_scale
+    margin = settings.grabcut_margin
+    refine = settings.grabcut_refine
+
+    def __init__(self, incremental:bool=settings.grabcut_incremental) -> None:
+        self.incremental = incremental
+        self.reset_requested = False
+        self.reset()
+
+    def request_reset(self) -> None:
+        ''' reset() before the next extract, on the thread extracting (a running one is left alone) '''
+        self.reset_requested = True
+
+    def reset(self) -> None:
+        ''' Forgets the previous capture, the next one is solved from its selection alone '''
+        self.previous = None # foreground mask of the last frame, 255 on the foreground
+        self.background_model = np.zeros((1, 65), np.float64)
+        self.foreground_model = np.zeros((1, 65), np.float64)
+
+    def begin(self, image:np.ndarray, rect:tuple) -> np.ndarray:
+        ''' :returns: the image with everything but the foreground set to black '''
+        mask = self.extract(image, rect)
+        return cv2.bitwise_and(image, image, mask=mask)
+
+    def extract(self, image:np.ndarray, rect:tuple) -> np.ndarray:
+        ''' :returns: uint8 mask of the image's size, 255 on the foreground '''
+        if self.reset_requested:
+            self.reset_requested = False
+            self.reset()
+
+        full = np.zeros(image.shape[:2], np.uint8)
+        rect = clip_rect(rect, image.shape)
+        if rect is None:
+            return full
+
+        x, y, w, h = rect
+        mx, my = int(w * self.margin), int(h * self.margin)
+        cx0, cy0 = max(x - mx, 0), max(y - my, 0)
+        cx1, cy1 = min(x + w + mx, image.shape[1]), min(y + h + my, image.shape[0])
+        crop = image[cy0:cy1, cx0:cx1]
+
+        scale = min(1.0, max(self.min_scale, self.work_size / max(crop.shape[:2])))
+        small = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else crop
+        sx, sy = int((x - cx0) * scale), int((y - cy0) * scale)
+        small_rect = (
+            sx, sy,
+            max(1, min(int(round(w * scale)), small.shape[1] - sx)),
+            max(1, min(int(round(h * scale)), small.shape[0] - sy))
+        )
+
+        seed = None
+        if self.incremental and self.previous is not None and self.previous.shape == full.shape:
+            seed = self.seed(self.previous[cy0:cy1, cx0:cx1], small.shape[:2], small_rect)
+
+        try:
+            mask, background_model, foreground_model = self.solve(small, small_rect, seed)
+        except cv2.error:
+            # e.g. a selection covering the whole frame leaves no background sample
+            self.reset()
+            full[y:y+h, x:x+w] = 255
+            return full
+        foreground = self.foreground(mask)
+
+        if scale < 1:
+            foreground = cv2.resize(foreground, (crop.shape[1], crop.shape[0]), interpolation=cv2.INTER_LINEAR)
+            _, foreground = cv2.threshold(foreground, 127, 255, cv2.THRESH_BINARY)
+            if self.refine:
+                band = int(np.ceil(1 / scale))
+                # copies: GC_EVAL (older OpenCV) would learn the models again at full resolution
+                foreground = self.refine_boundary(crop, foreground, background_model.copy(), foreground_model.copy(), band)
 
-    def begin(self, image, rect) -> np.ndarray:
-        self.mask = np.zeros(image.shape[:2], np.uint8)
+        full[cy0:cy1, cx0:cx1] = foreground
+        if self.incremental:
+            self.previous = full
+        return full
 
+    @staticmethod
+    def seed(previous:np.ndarray, shape:tuple, rect:tuple) -> np.ndarray:
+        '''
+            GrabCut mask for the next solve from the previous foreground (cropped like the new frame):
+            background outside the selection, the previous labels as probable ones inside.
+            None when the previous foreground does not reach the selection.
+        '''
+        previous = cv2.resize(previous, (shape[1], shape[0]), interpolation=cv2.INTER_NEAREST)
+        x, y, w, h = rect
+        inside = previous[y:y+h, x:x+w]
+        if not inside.any():
+            return None
+        mask = np.full(shape, cv2.GC_BGD, np.uint8)
+        mask[y:y+h, x:x+w] = np.where(inside > 0, cv2.GC_PR_FGD, cv2.GC_PR_BGD)
+        return mask
+
+    def solve(self, image:np.ndarray, rect:tuple, seed:np.ndarray=None) -> tuple:
+        '''
+            From the selection alone, or from `seed` and the models of the previous solve.
+            :returns: (GrabCut mask, background model, foreground model)
+        '''
+        if seed is not None:
+            try:
+                cv2.grabCut(
+                    img = image,
+                    mask = seed,
+                    rect = None,
+                    bgdModel = self.background_model,
+                    fgdModel = self.foreground_model,
+                    iterCount = self.incremental_iterations,
+                    mode = cv2.GC_EVAL,
+                )
+                return seed, self.background_model, self.foreground_model
+            except cv2.error:
+                pass # degenerate seed, e.g. a class without samples
+
+        mask = np.zeros(image.shape[:2], np.uint8)
+        self.background_model[:] = 0
+        self.foreground_model[:] = 0
         cv2.grabCut(
             img = image,
-            mask = self.mask,
+            mask = mask,
             rect = rect,
             bgdModel = self.background_model,
             fgdModel = self.foreground_model,
             iterCount = self.iterations,
             mode = cv2.GC_INIT_WITH_RECT,
         )
+        return mask, self.background_model, self.foreground_model
+
+    @staticmethod
+    def foreground(mask:np.ndarray) -> np.ndarray:
+        return np.where((mask == cv2.GC_FGD) | (mask == cv2.GC_PR_FGD), 255, 0).astype(np.uint8)
+
+    @classmethod
+    def refine_boundary(cls, image:np.ndarray, foreground:np.ndarray, background_model, foreground_model, band:int) -> np.ndarray:
+        ''' Pixels further than `band` from the upsampled boundary are kept, the others decided again '''
+        if not foreground.any():
+            return foreground
+
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * band + 1, 2 * band + 1))
+        mask = np.full(foreground.shape, cv2.GC_BGD, np.uint8)
+        mask[cv2.dilate(foreground, kernel) > 0] = cv2.GC_PR_BGD
+        mask[foreground > 0] = cv2.GC_PR_FGD
+        mask[cv2.erode(foreground, kernel) > 0] = cv2.GC_FGD
+
+        try:
+            cv2.grabCut(image, mask, None, background_model, foreground_model, 1, GC_EVAL_FROZEN)
+        except cv2.error:
+            return foreground
+        return cls.foreground(mask)
+
+
+class LeafThreshold:
+    '''
+        Leaf-green HSV threshold inside the selection, for plain backgrounds.
+
+        Much cheaper than GrabCut; the lesions (brown, black) inside the leaf
+        are kept by filling the largest green region.
+
+        :param order: channel order of the frames, the preprocessing stage keeps the camera's BGR
+    '''
+    lower = np.array(settings.leaf_hsv_lower, np.uint8)
+    upper = np.array(settings.leaf_hsv_upper, np.uint8)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+
+    def __init__(self, order:str=BGR) -> None:
+        self.conversion = cv2.COLOR_RGB2HSV if order == RGB else cv2.COLOR_BGR2HSV
+
+    def request_reset(self) -> None:
+        pass # stateless
+
+    def reset(self) -> None:
+        pass
+
+    def begin(self, image:np.ndarray, rect:tuple) -> np.ndarray:
+        mask = self.extract(image, rect)
+        return cv2.bitwise_and(image, image, mask=mask)
+
+    def extract(self, image:np.ndarray, rect:tuple) -> np.ndarray:
+        full = np.zeros(image.shape[:2], np.uint8)
+        rect = clip_rect(rect, image.shape)
+        if rect is None:
+            return full
+
+        x, y, w, h = rect
+        hsv = cv2.cvtColor(image[y:y+h, x:x+w], self.conversion)
+        leaf = cv2.inRange(hsv, self.lower, self.upper)
+        leaf = cv2.morphologyEx(leaf, cv2.MORPH_OPEN, self.kernel)
+
+        contours = cv2.findContours(leaf, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2] # OpenCV 3 and 4
+        if contours:
+            filled = np.zeros_like(leaf)
+            cv2.drawContours(filled, [max(contours, key=cv2.contourArea)], -1, 255, cv2.FILLED)
+            full[y:y+h, x:x+w] = filled
+        return full
+
 
-        grabcut_mask = np.where((self.mask == cv2.GC_PR_BGD) | (self.mask == cv2.GC_BGD), 0, 1).astype("uint8")
-        return image * grabcut_mask[:, :, np.newaxis]
\ No newline at end of file
+# settings.foreground_mode
+EXTRACTORS = {
+    'grabcut': GrabCut,
+    'threshold': LeafThreshold,
+}
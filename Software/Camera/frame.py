@@ -0,0 +1,32 @@
+from dataclasses import dataclass
+import numpy as np
+import cv2
+
+BGR = 'BGR' # OpenCV: capture devices, imread / imencode
+RGB = 'RGB' # the model (the trainer notebook loads images with keras load_img)
+
+
+@dataclass
+class Frame:
+    '''
+        Pixels and the order of their channels.
+
+        Frames stay in the order they were produced in; every consumer asks
+        for the layout it needs with as_order(), which returns the array
+        itself when it already matches and converts it once otherwise.
+    '''
+    data:np.ndarray
+    order:str = BGR
+
+    @property
+    def shape(self) -> tuple:
+        return self.data.shape
+
+    def as_order(self, order:str, dst:np.ndarray=None) -> np.ndarray:
+        if order == self.order:
+            return self.data
+        return cv2.cvtColor(self.data, cv2.COLOR_BGR2RGB, dst=dst) # the same swap both ways
+
+    def with_data(self, data:np.ndarray) -> 'Frame':
+        ''' Other pixels (resized, masked ...) in the same order '''
+        return Frame(data, self.order)
@@ -0,0 +1,286 @@
+from concurrent.futures import Future
+from Config import settings
+from Utils.lazy import Lazy
+from .frame import Frame, RGB
+import numpy as np
+import queue
+import threading
+import time
+import cv2
+
+# Channel order of model inputs, as the trainer notebook loaded its images
+INPUT_ORDER = RGB
+
+
+class Backend:
+    '''
+        Inference backend interface.
+
+        :method predict: float32 batch of shape (n, *settings.IMAGE_SHAPE) with
+                         RGB values in [0, 255] -> logits of shape (n, len(settings.class_names))
+        :attr latency:   seconds spent loading, tracing and in the cold / warm calls of warm_up()
+    '''
+    name = ''
+
+    def __init__(self) -> None:
+        self.latency = {}
+
+    def predict(self, batch:np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def warm_up(self, runs:int=settings.warmup_runs) -> dict:
+        ''' Runs a dummy input once cold and `runs` more times warm, so the first capture is not the slow one '''
+        dummy = np.zeros((1, *settings.IMAGE_SHAPE), np.float32)
+
+        start = time.perf_counter()
+        self.predict(dummy)
+        self.latency['cold'] = time.perf_counter() - start
+
+        warm = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            self.predict(dummy)
+            warm.append(time.perf_counter() - start)
+        if warm:
+            self.latency['warm'] = float(np.median(warm))
+        return self.latency
+
+    def __repr__(self) -> str:
+        return self.name
+
+
+class KerasBackend(Backend):
+    name = 'keras'
+
+    def __init__(self, model_path:str=settings.keras_model_path) -> None:
+        super().__init__()
+        import tensorflow as tf
+        self.tf = tf
+
+        start = time.perf_counter()
+        self.model = tf.keras.models.load_model(model_path)
+        self.latency['load'] = time.perf_counter() - start
+
+        # one concrete graph for any batch size, traced here instead of on the first capture
+        start = time.perf_counter()
+        spec = tf.TensorSpec((None, *settings.IMAGE_SHAPE), tf.float32)
+        self._infer = tf.function(lambda batch: self.model(batch, training=False)).get_concrete_function(spec)
+        self.latency['trace'] = time.perf_counter() - start
+
+    def predict(self, batch:np.ndarray) -> np.ndarray:
+        return self._infer(self.tf.convert_to_tensor(batch, self.tf.float32)).numpy()
+
+
+class TFLiteBackend(Backend):
+    '''
+        TensorFlow Lite interpreter. Works with float models and with int8/uint8
+        quantized ones, the input is quantized and the output dequantized with
+        the parameters stored in the model.
+    '''
+    name = 'tflite'
+
+    def __init__(self, model_path:str=settings.tflite_model_path, num_threads:int=settings.inference_threads) -> None:
+        super().__init__()
+        start = time.perf_counter()
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size = int(self.input['shape'][0])
+        self.latency['load'] = time.perf_counter() - start
+
+        if np.issubdtype(self.input['dtype'], np.integer):
+            self.name = 'tflite-int8'
+
+    def _resize(self, batch_size:int) -> None:
+        shape = list(self.input['shape'])
+        shape[0] = batch_size
+        self.interpreter.resize_tensor_input(self.input['index'], shape)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size = batch_size
+
+    def _quantize(self, batch:np.ndarray) -> np.ndarray:
+        dtype = self.input['dtype']
+        if not np.issubdtype(dtype, np.integer):
+            return batch.astype(dtype, copy=False)
+        scale, zero_point = self.input['quantization']
+        info = np.iinfo(dtype)
+        return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+
+    def _dequantize(self, logits:np.ndarray) -> np.ndarray:
+        if not np.issubdtype(self.output['dtype'], np.integer):
+            return logits.astype(np.float32, copy=False)
+        scale, zero_point = self.output['quantization']
+        return (logits.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch:np.ndarray) -> np.ndarray:
+        if batch.shape[0] != self.batch_size:
+            self._resize(batch.shape[0])
+        self.interpreter.set_tensor(self.input['index'], self._quantize(batch))
+        self.interpreter.invoke()
+        return self._dequantize(self.interpreter.get_tensor(self.output['index']))
+
+
+BACKENDS = {
+    'keras': lambda: KerasBackend(settings.keras_model_path),
+    'tflite': lambda: TFLiteBackend(settings.tflite_model_path, settings.inference_threads),
+    'tflite-int8': lambda: TFLiteBackend(settings.tflite_int8_model_path, settings.inference_threads),
+}
+
+
+def load_backend(name:str=None, warmup_runs:int=settings.warmup_runs) -> Backend:
+    '''
+        :param name: one of BACKENDS, defaults to settings.inference_backend
+        :param warmup_runs: warm calls after the cold one, None skips the warm-up
+    '''
+    name = name or settings.inference_backend
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown inference backend "{name}", expected one of {list(BACKENDS)}')
+    backend = BACKENDS[name]()
+    if warmup_runs is not None:
+        backend.warm_up(warmup_runs)
+        print('Model {} ready: {}'.format(backend, ', '.join(f'{k} {v*1000:.1f} ms' for k, v in backend.latency.items())))
+    return backend
+
+
+def softmax(logits:np.ndarray) -> np.ndarray:
+    ''' The model outputs logits (trained with from_logits=True) '''
+    e = np.exp(logits - np.max(logits, axis=-1, keepdims=True))
+    return e / np.sum(e, axis=-1, keepdims=True)
+
+
+def input_pixels(frame:Frame, roi:tuple=None, out:np.ndarray=None) -> np.ndarray:
+    '''
+        Frame, or its (x, y, width, height) region -> uint8 pixels of settings.IMAGE_SHAPE in
+        INPUT_ORDER: a single INTER_AREA resize (into `out` when given) and an in-place channel swap.
+    '''
+    data = frame.data
+    if roi is not None:
+        x, y, w, h = roi
+        data = data[y:y+h, x:x+w]
+    out = cv2.resize(data, settings.IMAGE_SIZE, dst=out, interpolation=cv2.INTER_AREA)
+    if frame.order != INPUT_ORDER:
+        cv2.cvtColor(out, cv2.COLOR_BGR2RGB, dst=out)
+    return out
+
+
+class ModelInput:
+    '''
+        Frame (+ region) -> float32 model input without intermediate allocations:
+        input_pixels() into a reused uint8 buffer, then the cast straight into
+        the destination, e.g. a row of a batch buffer.
+
+            prepare = ModelInput()
+            prepare(frame, roi, out=batch[i])
+
+        Keeps its buffers, so one instance per thread.
+    '''
+
+    def __init__(self) -> None:
+        self.pixels = np.empty(settings.IMAGE_SHAPE, np.uint8)
+        self.output = np.empty(settings.IMAGE_SHAPE, np.float32) # when no `out` is given, valid until the next call
+
+    def __call__(self, frame:Frame, roi:tuple=None, out:np.ndarray=None) -> np.ndarray:
+        input_pixels(frame, roi, out=self.pixels)
+        out = self.output if out is None else out
+        np.copyto(out, self.pixels, casting='unsafe')
+        return out
+
+
+class InferenceService:
+    '''
+        Runs a backend on its own thread and coalesces single requests into
+        micro-batches: once a request arrives, the service waits at most
+        `max_latency` seconds for up to `max_batch_size - 1` more before calling
+        the backend once for all of them.
+
+            service = InferenceService(load_backend())
+            scores = service.submit(image).result() # softmax scores, one per class
+
+        Frames are submitted as they are: the service's thread prepares them
+        (ModelInput) straight into its batch buffer.
+
+        :param backend: a Backend, or a Lazy one that is resolved on the first batch
+    '''
+    STOP = object()
+
+    def __init__(self, backend, max_batch_size:int=settings.max_batch_size, max_latency:float=settings.max_batch_latency) -> None:
+        self._backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.batch_sizes = [] # size of every batch run, for instrumentation
+
+        self._requests = queue.Queue()
+        self._buffer = np.empty((max_batch_size, *settings.IMAGE_SHAPE), np.float32)
+        self._thread = threading.Thread(target=self._run, name='inference service', daemon=True)
+        self._thread.start()
+
+    @property
+    def backend(self) -> Backend:
+        return self._backend.get() if isinstance(self._backend, Lazy) else self._backend
+
+    def submit(self, image, roi:tuple=None) -> Future:
+        '''
+            :param image: one model input of settings.IMAGE_SHAPE, or a Frame of any size
+            :param roi:   region of the Frame to classify
+        '''
+        future = Future()
+        self._requests.put((image, roi, future))
+        return future
+
+    def predict(self, images:list) -> np.ndarray:
+        ''' Blocking helper for several images, they share batches with other callers '''
+        return np.stack([f.result() for f in [self.submit(image) for image in images]])
+
+    def close(self, timeout=None) -> None:
+        self._requests.put(self.STOP)
+        self._thread.join(timeout)
+
+    def _collect(self) -> list:
+        first = self._requests.get()
+        if first is self.STOP:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is self.STOP:
+                self._requests.put(self.STOP) # stop after this batch
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self) -> None:
+        prepare = ModelInput()
+        while True:
+            batch = self._collect()
+            if batch is None:
+                break
+
+            n = len(batch)
+            try:
+                for i, (image, roi, _) in enumerate(batch):
+                    if isinstance(image, Frame):
+                        prepare(image, roi, out=self._buffer[i])
+                    else:
+                        self._buffer[i] = image
+                scores = softmax(self.backend.predict(self._buffer[:n]))
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batch_sizes.append(n)
+            for (_, _, future), score in zip(batch, scores):
+                future.set_result(score)
@@ -0,0 +1,100 @@
+from dataclasses import dataclass
+from Utils.utils import Image
+from .frame import Frame
+import queue
+import threading
+import traceback
+
+
+class DropQueue(queue.Queue):
+    ''' Bounded queue that discards its oldest item instead of blocking the producer '''
+
+    def __init__(self, maxsize=1) -> None:
+        super().__init__(maxsize=maxsize)
+        self.dropped = 0
+
+    def put(self, item, block=True, timeout=None) -> None:
+        with self.not_full:
+            if 0 < self.maxsize <= self._qsize():
+                self._get()
+                self.unfinished_tasks -= 1
+                self.dropped += 1
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def clear(self) -> None:
+        with self.mutex:
+            self.queue.clear()
+            self.unfinished_tasks = 0
+
+
+@dataclass
+class Capture:
+    ''' A frame travelling from the preprocessing stage to persistence '''
+    frame:Frame
+    roi:tuple = None # zoomed region of the frame (x, y, width, height), None for all of it
+    project:str = '' # project selected when it was taken, saved there even if another one is selected since
+    grabcut:bool = False
+    rect:tuple = None
+    classification:str = ''
+    confidence:float = 0.0
+    image:Image = None
+
+
+class Stage(threading.Thread):
+    '''
+        Worker thread that takes items from `inbox`, runs `target(item)` and
+        forwards every non-None result to `outbox`.
+    '''
+    STOP = object()
+
+    def __init__(self, name:str, target, inbox:queue.Queue, outbox:queue.Queue=None) -> None:
+        super().__init__(name=name, daemon=True)
+        self.target = target
+        self.inbox = inbox
+        self.outbox = outbox
+
+    def stop(self) -> None:
+        # queued behind what is pending, even on a DropQueue (which would evict an item for it)
+        queue.Queue.put(self.inbox, self.STOP)
+
+    def run(self) -> None:
+        while True:
+            item = self.inbox.get()
+            if item is self.STOP:
+                break
+            try:
+                result = self.target(item)
+            except Exception:
+                print(f'[{self.name}] stage failed:')
+                traceback.print_exc()
+                continue
+            if result is not None and self.outbox is not None:
+                self.outbox.put(result)
+
+
+class Pipeline:
+    ''' Chain of stages connected by bounded queues (DropQueue where items may be lost) '''
+
+    def __init__(self) -> None:
+        self.stages:list[Stage] = []
+
+    def add(self, name:str, target, inbox:queue.Queue, outbox:queue.Queue=None) -> Stage:
+        stage = Stage(name, target, inbox, outbox)
+        self.stages.append(stage)
+        return stage
+
+    def start(self) -> None:
+        for stage in self.stages:
+            if not stage.is_alive():
+                stage.start()
+
+    def stop(self, timeout=None) -> None:
+        # upstream first, so every stage drains what the previous one produced
+        for stage in self.stages:
+            if stage.is_alive():
+                stage.stop()
+                stage.join(timeout)
+        # threads cannot be restarted, rebuild them for the next start()
+        self.stages = [Stage(s.name, s.target, s.inbox, s.outbox) for s in self.stages]
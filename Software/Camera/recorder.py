@@ -1,21 +1,51 @@
 from PyQt5 import QtGui, QtCore
 from Utils.utils import Analytics, Image
+from Utils import lazy
+from Utils.timing import registry as timings
 from Config import settings
 from . import foreground_extraction as forex
 from . import calibrated
+from . import enhance
+from . import inference
+from . import pipeline
+from . import sources
+from .frame import Frame, BGR
+from .writer import ImageWriter
 
 import cv2
-import os
+import queue
+import threading
+import time
 
-import tensorflow as tf
 import numpy as np
 
+# Qt >= 5.14 shows BGR frames as they are, older versions get one swap at the display size
+PREVIEW_FORMAT = getattr(QtGui.QImage, 'Format_BGR888', None)
+
 class Recorder(QtCore.QThread):
+    '''
+        Grabber thread of the capture pipeline:
+            grabber -> preprocessing -> inference -> persistence
+        Each stage runs on its own worker and is connected to the next one by a
+        bounded queue, so classification and disk writes never block the live
+        preview: frames are dropped (oldest first) when preprocessing lags,
+        captures are never dropped. Every step is timed in Utils.timing.registry.
+
+        The grabber is OPENING (retrying with backoff), RUNNING, PAUSED or
+        STOPPED; it sleeps on `condition` while opening fails or it is paused,
+        and wakes up as soon as it is resumed, stopped or given another camera.
+    '''
+    OPENING, RUNNING, PAUSED, STOPPED = 'opening', 'running', 'paused', 'stopped'
+
     changePixmap = QtCore.pyqtSignal(QtGui.QImage)
     doCapture = QtCore.pyqtSignal(bool)
     pause = QtCore.pyqtSignal(bool)
     projectPath = QtCore.pyqtSignal(str)
     on_classify = QtCore.pyqtSignal(bool)
+    status = QtCore.pyqtSignal(str)
+    loaded = QtCore.pyqtSignal(str)
+    backlog = QtCore.pyqtSignal(int) # captures waiting to be written
+    saved = QtCore.pyqtSignal(object) # pipeline.Capture written by the writer, recorded on the GUI thread
 
     # Camera properties
     brightness = QtCore.pyqtSignal(int)
@@ -23,29 +53,32 @@ class Recorder(QtCore.QThread):
     sharpness = QtCore.pyqtSignal(float)
     scale = QtCore.pyqtSignal(float)
     defisheye = QtCore.pyqtSignal(bool)
+    defisheyeUnavailable = QtCore.pyqtSignal(str) # the calibration failed to load, defisheye was turned off
 
-    # OpenCV capture device
+    # Frame source, the selected camera unless a recording is replayed; opened by run()
     selectedCameraIndex = 0
-    cap = cv2.VideoCapture(selectedCameraIndex)
-    isOpened = cap.isOpened()
+    source:sources.FrameSource = None
+    isOpened = False
+    state = STOPPED
 
-    # Tensorflow model
-    loaded_model =  tf.keras.models.load_model('./models/keras_model.h5')
+    # Inference backend (settings.inference_backend), created on first use or by warmUp()
+    backend = lazy.Lazy('model', inference.load_backend)
 
     # Latest output
     image:Image = None
     image_path = ''
 
-    # Foreground Extraction
-    grabcut = forex.GrabCut()
+    # Sharpness (reuses per-resolution buffers)
+    unsharp = enhance.UnsharpMask()
+
+    # Calibrated JINJIEAN B19 FPV Mini Camera, only needed once defisheye is enabled
+    calibrated_camera = lazy.Lazy('calibration', lambda: calibrated.CalibratedCamera().start())
 
-    # Calibrated JINJIEAN B19 FPV Mini Camera
-    calibrated_camera = calibrated.CalibratedCamera().start()
-    
 
-    def __init__(self, parent=None, selectedPath='') -> None:
+    def __init__(self, parent=None, selectedPath='', source:sources.FrameSource=None) -> None:
         QtCore.QThread.__init__(self, parent)
         self.parent = parent
+        self.source = source
 
         self.brightnessValue = 0
         self.brightness.connect(self.brightnessChanged)
@@ -65,22 +98,55 @@ class Recorder(QtCore.QThread):
         self.doCaptureValue = False
         self.doCapture.connect(self.onCapture)
 
+        # Grabber state changes (pause, stop, camera switch), waited on by run()
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.reopen = False
+
         self.pauseValue = False
         self.pause.connect(self.pauseEmitted)
 
         self.selectedPath = selectedPath
         self.projectPath.connect(self.projectPathSelected)
 
+        # Preview: one buffer at the display size, reused while the GUI shows at most one frame
+        self.previewBuffer = None
+        self.previewPending = False
+        self.previewSkipped = 0
+
+        self.service = inference.InferenceService(self.backend)
+        self.writer = ImageWriter(backlog=self.backlog.emit)
+        self.saved.connect(self.record)
+
+        # Foreground Extraction (settings.foreground_mode), keeps the last capture's models
+        self.grabcut = forex.EXTRACTORS[settings.foreground_mode]()
+
+        # Stages
+        # only live frames may be dropped, captures wait for their turn
+        self.frames = pipeline.DropQueue(maxsize=settings.frame_queue_size)
+        self.captures = queue.Queue(maxsize=settings.capture_queue_size)
+        self.results = queue.Queue(maxsize=settings.result_queue_size)
+
+        self.pipeline = pipeline.Pipeline()
+        self.pipeline.add('preprocessing', self.preprocess, inbox=self.frames, outbox=self.captures)
+        self.pipeline.add('inference', self.infer, inbox=self.captures, outbox=self.results)
+        self.pipeline.add('persistence', self.persist, inbox=self.results)
+
+    def warmUp(self):
+        ''' Loads the model and the calibration in the background, emits `loaded` for each '''
+        for resource in (self.backend, self.calibrated_camera):
+            resource.warm_up(done=lambda r: self.loaded.emit(r.name))
+
     def brightnessChanged(self, value):
         self.brightnessValue = value
         # self.cap.set(cv2.CAP_PROP_BRIGHTNESS, value)
         print(f'Brightness: {value}')
-    
+
     def contrastChanged(self, value):
         self.contrastValue = value
         # self.cap.set(cv2.CAP_PROP_CONTRAST, value)
         print(f'Contrast: {value}')
-    
+
     def sharpnessChanged(self, value):
         self.sharpnessValue = value
         # self.cap.set(cv2.CAP_PROP_SHARPNESS, value)
@@ -89,58 +155,38 @@ class Recorder(QtCore.QThread):
     def scaleChanged(self, value):
         self.scaleValue = value
         print(f'Zoom: {value}')
-    
+
     def defisheyeChanged(self, value):
         self.defisheyeValue = value
         print(f'Defisheye: {value}')
-    
+
     def onCapture(self, signal):
         self.doCaptureValue = signal
-    
+
     def pauseEmitted(self, value):
-        self.pauseValue = value
-    
+        with self.condition:
+            self.pauseValue = value
+            self.condition.notify_all()
+
+    def stop(self):
+        ''' Ends run() after the frame being grabbed, also while opening or paused; wait() for it '''
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+
     def projectPathSelected(self, path):
         self.selectedPath = path
         print(f'New selected path is: {self.selectedPath}')
 
-    def saveImage(self, imagePath, image):
-        # Create folder if does not exist
-        if not os.path.isdir(imagePath):
-            os.mkdir(imagePath)
+    def sharp_mask(self, image, amount=1.0, threshold=0):
+        return self.unsharp.apply(image, amount=amount, threshold=threshold)
 
-        # Create a file
-        if os.path.exists(self.image_path):
-            print("image already exist.")
-            return
-        cv2.imwrite(self.image_path, image)
-    
-    def sharp_mask(self, image, kernel_size=(5, 5), sigma=1.0, amount=1.0, threshold=0):
-        blurred = cv2.GaussianBlur(image, kernel_size, sigma)
-        sharpened = float(amount + 1) * image - float(amount) * blurred
-        sharpened = np.maximum(sharpened, np.zeros(sharpened.shape))
-        sharpened = np.minimum(sharpened, 255 * np.ones(sharpened.shape))
-        sharpened = sharpened.round().astype(np.uint8)
-        if threshold > 0:
-            low_contrast_mask = np.absolute(image - blurred) < threshold
-            np.copyto(sharpened, image, where=low_contrast_mask)
-        return sharpened
-    
     def contrast_brightness(self, image, contrastValue, brightnessValue):
         return cv2.convertScaleAbs(image, alpha=contrastValue, beta=brightnessValue)
 
-    def classify(self, img_array:np.ndarray) -> list:
-        ### !!!!!!!!!
-        # TODO: make prediction then save to a specified folder
-        # Rebuild model
-
-        img_array_batch = tf.expand_dims(img_array, 0) # create a batch
-
-        yhat = self.loaded_model.predict(img_array_batch)
-        score = tf.nn.softmax(yhat[0]) # use only when softmax included in model
-
-        print(yhat)
-        print(type(score))
+    def classify(self, frame:Frame, roi:tuple=None) -> tuple:
+        # prepared into its batch and batched with any other pending request by the inference service
+        score = self.service.submit(frame, roi=roi).result()
 
         classification = settings.class_names[np.argmax(score)]
         confidence = np.max(score)
@@ -149,105 +195,283 @@ class Recorder(QtCore.QThread):
             "This image most likely belongs to {} with a {:.2f} percent confidence."
             .format(classification, confidence)
         )
+        return (classification, confidence)
 
-        imagePath = f'{self.selectedPath}/{classification}'
-        imageName = settings.imageName
-        f_extension = settings.f_extension
+    def onCamSelectedIndex(self, index):
+        ''' The grabber switches to the camera before its next frame '''
+        with self.condition:
+            self.selectedCameraIndex = index
+            self.reopen = True
+            self.condition.notify_all()
+
+    # Stage: preprocessing
+    def preprocess(self, frame:np.ndarray) -> pipeline.Capture:
+        ''' Adjusts a raw frame, emits the preview and hands captures to inference '''
+        self.scaleValue = round(self.scaleValue, 2)
+
+        # undistortion, ROI crop and zoom in a single remap
+        zoomed = self.defisheyeValue
+        if zoomed:
+            try:
+                calibrated_camera = self.calibrated_camera.get()
+            except Exception as e:
+                # the failure is kept by the Lazy: turned off once instead of raising on every frame
+                zoomed = self.defisheyeValue = False
+                print(f'Defisheye unavailable: {e}')
+                self.defisheyeUnavailable.emit(str(e))
+            else:
+                with timings.span('undistort'):
+                    frame = calibrated_camera.undistort(img=frame, scale=self.scaleValue)
+
+        # frames stay BGR, every consumer converts at most once (Camera.frame)
+        with timings.span('flip'):
+            image = cv2.flip(frame, 1)
+        with timings.span('contrast'):
+            image = self.contrast_brightness(image, contrastValue=self.contrastValue, brightnessValue=self.brightnessValue)
+        with timings.span('sharpen'):
+            image = self.sharp_mask(image, amount=self.sharpnessValue)
+        h, w, ch = image.shape
+
+        if zoomed or self.scaleValue == 1:
+            cropped = image
+            roi = (0, 0, w, h)
+        else:
+            #prepare the crop
+            centerX, centerY = int(h/2), int(w/2)
+            radiusX, radiusY = int(centerX*self.scaleValue), int(centerY*self.scaleValue)
+
+            minX, maxX = centerX-radiusX, centerX+radiusX
+            minY, maxY = centerY-radiusY, centerY+radiusY
+
+            cropped = image[minX:maxX, minY:maxY] # a view, resized once for the preview
+            roi = (minY, minX, maxY - minY, maxX - minX)
+
+        with timings.span('preview'):
+            self.emitPreview(cropped)
+
+        if not self.doCaptureValue:
+            return None
+        self.doCaptureValue = False
+
+        # the zoom is applied by each consumer (model input, writer) in its own single resize
+        with timings.span('crop'):
+            captured = image.copy() # may be a reused sharpening buffer
 
-        # Generate new file name
-        fileNextCount = len(os.listdir(imagePath)) + 1
-        self.image_path = f'{imagePath}/{imageName+str(fileNextCount)+f_extension}'
+        return pipeline.Capture(
+            frame = Frame(captured, BGR),
+            roi = None if cropped is image else roi,
+            project = self.selectedPath,
+            grabcut = self.parent.grabcut_checkbox.isChecked(),
+            rect = self.frame_rect(self.parent.resizableRect.getRect(), roi)
+        )
+
+    @staticmethod
+    def preview_size(shape:tuple) -> tuple:
+        ''' (width, height) of a frame fitted in settings.camera_scale, keeping its aspect ratio '''
+        h, w = shape[:2]
+        scale = min(settings.camera_scale[0] / w, settings.camera_scale[1] / h)
+        return (max(1, round(w * scale)), max(1, round(h * scale)))
+
+    def emitPreview(self, image:np.ndarray) -> None:
+        '''
+            BGR image -> preview. Resizes straight to the display size into the preview buffer and emits a QImage over it.
+            While the GUI has not shown the previous frame (previewDone), newer frames are
+            skipped instead of queued: the buffer is still in use and the frame would be stale.
+        '''
+        if self.previewPending:
+            self.previewSkipped += 1
+            return
+
+        width, height = self.preview_size(image.shape)
+        if self.previewBuffer is None or self.previewBuffer.shape[:2] != (height, width):
+            self.previewBuffer = np.empty((height, width, 3), np.uint8)
+
+        shrink = width < image.shape[1]
+        cv2.resize(image, (width, height), dst=self.previewBuffer, interpolation=cv2.INTER_AREA if shrink else cv2.INTER_LINEAR)
+        if PREVIEW_FORMAT is None:
+            cv2.cvtColor(self.previewBuffer, cv2.COLOR_BGR2RGB, dst=self.previewBuffer)
+
+        self.previewPending = True
+        self.changePixmap.emit(QtGui.QImage(
+            self.previewBuffer, width, height, self.previewBuffer.strides[0],
+            QtGui.QImage.Format_RGB888 if PREVIEW_FORMAT is None else PREVIEW_FORMAT
+        ))
+        timings.tick('frame')
+
+    def previewDone(self) -> None:
+        ''' Called by the GUI once the last preview is on screen (copied into a QPixmap) '''
+        self.previewPending = False
+
+    def dropped(self) -> dict:
+        '''
+            Frames lost so far, by where:
+                camera   skipped by the device (CameraSource)
+                stale    replaced by a newer one before preprocessing took them
+                preview  processed, but the GUI was still showing the previous one
+        '''
+        return {
+            'camera': getattr(self.source, 'dropped', 0),
+            'stale': self.frames.dropped,
+            'preview': self.previewSkipped,
+        }
+
+    @classmethod
+    def frame_rect(cls, rect:tuple, roi:tuple) -> tuple:
+        '''
+            Selection in preview coordinates (the image is centered in the view) -> frame pixels,
+            the preview showing the (x, y, width, height) region `roi` of the frame
+        '''
+        x, y, w, h = rect
+        rx, ry, rw, rh = roi
+        width, height = cls.preview_size((rh, rw))
+        scale = rw / width
+        left = (settings.camera_scale[0] - width) / 2
+        top = (settings.camera_scale[1] - height) / 2
+        return (rx + int((x - left) * scale), ry + int((y - top) * scale), int(w * scale), int(h * scale))
+
+    # Stage: inference
+    def infer(self, capture:pipeline.Capture) -> pipeline.Capture:
+        if capture.grabcut:
+            with timings.span('grabcut'):
+                capture.frame = capture.frame.with_data(self.grabcut.begin(image=capture.frame.data, rect=capture.rect))
+
+        # Classify the zoomed region, resized to the model's input_shape in the inference batch
+        with timings.span('inference'):
+            capture.classification, capture.confidence = self.classify(capture.frame, roi=capture.roi)
 
         today = Analytics.get_clock()
-        self.image = Image(
+        capture.image = Image(
             id = Analytics.create_new_id(),
-            path = self.image_path,
-            classification = classification,
-            confidence = float(confidence),
-            tensor_shape = img_array.shape,
-            type = f_extension,
+            path = '',
+            classification = capture.classification,
+            confidence = float(capture.confidence),
+            tensor_shape = settings.IMAGE_SHAPE,
+            type = settings.f_extension,
             created = today,
             modified = today
         )
+        return capture
+
+    # Stage: persistence
+    def persist(self, capture:pipeline.Capture) -> None:
+        # Save original image, in the background (blocks only when the writer is full)
+        with timings.span('save'):
+            self.image_path = self.writer.submit(
+                capture.project, capture.classification, capture.frame, roi=capture.roi,
+                done = lambda path: self.written(capture, path)
+            )
+        capture.image.path = self.image_path
+        self.image = capture.image
+
+    def written(self, capture:pipeline.Capture, path:str) -> None:
+        '''
+            Writer thread, once the file is on disk: analytics only records images
+            that exist, the preview and its thumbnail need the file.
+        '''
+        capture.image.path = self.image_path = path
+        self.saved.emit(capture)
+
+        self.parent.recorder_results.emit(
+            {
+                'classification': capture.classification,
+                'confidence': capture.confidence,
+                'image_path': path
+            }
+        )
 
+    def record(self, capture:pipeline.Capture) -> None:
+        ''' GUI thread, where the project cannot change meanwhile: the capture's project gets the record '''
+        analytics = self.parent.analytics
+        with timings.span('analytics'):
+            if analytics.path == capture.project:
+                analytics.add_image(image=capture.image)
+            else:
+                Analytics.add_image_to(capture.project, capture.image)
         self.on_classify.emit(True)
-        return (classification, confidence)
 
-    def onCamSelectedIndex(self, index):
-        self.selectedCameraIndex = index
-        self.pauseValue = True
-        self.cap = cv2.VideoCapture(self.selectedCameraIndex)
-        self.isOpened = self.cap.isOpened()
-        self.pauseValue = False
- 
+    def openSource(self) -> bool:
+        '''
+            OPENING: (re)opens the source, the selected camera unless a recording is replayed,
+            waiting settings.camera_retry_delay, then twice as long ... between attempts.
+            :returns: False when stopped first
+        '''
+        self.state = self.OPENING
+        self.isOpened = False
+        start = time.perf_counter()
+        delay = settings.camera_retry_delay
+        while True:
+            with self.condition:
+                if self.stopping:
+                    return False
+                if self.source is None or self.reopen:
+                    if self.source is not None:
+                        self.source.release()
+                    self.source = sources.CameraSource(self.selectedCameraIndex)
+                    self.reopen = False
+
+            if self.source.open(): # may block for a while, outside the lock
+                break
+
+            self.status.emit('Trying to open the camera, please wait.')
+            with self.condition:
+                self.condition.wait_for(lambda: self.stopping or self.reopen, timeout=delay)
+            delay = min(2 * delay, settings.camera_retry_max_delay)
+
+        lazy.timings.setdefault('camera', time.perf_counter() - start)
+        self.isOpened = True
+        return True
+
+    # Stage: grabber
     def run(self):
-        while not self.isOpened:
-            self.parent.videoCapture.setText('Trying to open the camera, please wait.')
-            self.cap = cv2.VideoCapture(self.selectedCameraIndex)
-            self.isOpened = self.cap.isOpened()
-
-        while self.isOpened:
-            ret, frame = self.cap.read()
-            self.scaleValue = round(self.scaleValue, 2)
+        if not self.openSource():
+            self.state = self.STOPPED
+            return
 
-            if self.defisheyeValue:
-                frame = self.calibrated_camera.undistort(img=frame)
+        self.pipeline.start()
+
+        # Drains the device continuously: frames are only decoded when wanted and the
+        # preprocessing stage always takes the newest one (frames queue of one)
+        failures = 0
+        while True:
+            with self.condition:
+                if self.pauseValue and not (self.stopping or self.reopen):
+                    self.state = self.PAUSED
+                    self.condition.wait_for(lambda: not self.pauseValue or self.stopping or self.reopen)
+                if self.stopping:
+                    break
+                reopen = self.reopen # cleared by openSource()
+
+            if reopen or failures >= settings.camera_grab_failures:
+                if not reopen:
+                    print(f'{self.source} lost, opening it again')
+                    self.source.release()
+                failures = 0
+                if not self.openSource():
+                    break
+            elif self.state == self.PAUSED:
+                self.source.resume()
+            self.state = self.RUNNING
+
+            with timings.span('grab'):
+                ret = self.source.grab()
+
+            if ret:
+                failures = 0
+            elif self.source.live:
+                failures += 1
 
             if ret and not self.pauseValue:
-                rgbImage = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                rgbImage = cv2.flip(rgbImage, 1)
-                rgbImage = self.contrast_brightness(rgbImage, contrastValue=self.contrastValue, brightnessValue=self.brightnessValue)
-                rgbImage = self.sharp_mask(rgbImage, amount=self.sharpnessValue)
-                h, w, ch = rgbImage.shape
-
-                #prepare the crop
-                centerX, centerY = int(h/2), int(w/2)
-                radiusX, radiusY = int(centerX*self.scaleValue), int(centerY*self.scaleValue)
-
-                minX, maxX = centerX-radiusX, centerX+radiusX
-                minY, maxY = centerY-radiusY, centerY+radiusY
-
-                cropped = rgbImage[minX:maxX, minY:maxY]
-                resized_cropped = cv2.resize(cropped, (w, h))
-
-                bytesPerLine = ch * w
-                convertToQtFormat = QtGui.QImage(resized_cropped, w, h, bytesPerLine, QtGui.QImage.Format_RGB888)
-                p = convertToQtFormat.scaled(*settings.camera_scale)
-                self.changePixmap.emit(p)
-
-                # Save current frame
-                if self.doCaptureValue:
-                    if self.parent.grabcut_checkbox.isChecked():
-                        resized_cropped = self.grabcut.extract(image=resized_cropped, rect=self.parent.resizableRect.getRect())
-
-                    # Classify resized image based on model's input_shape
-                    img_array = cv2.cvtColor(
-                        cv2.resize(
-                            src = resized_cropped,
-                            dsize = settings.IMAGE_SIZE,
-                            interpolation = cv2.INTER_AREA
-                        ),
-                        cv2.COLOR_BGR2RGB
-                    )
-
-                    classification, confidence = self.classify(img_array.astype(np.float32))
-
-                    for cname in settings.class_names:
-                        if cname == classification:
-                            # Save original image
-                            self.saveImage(
-                                f'{self.selectedPath}/{cname}',
-                                cv2.cvtColor(resized_cropped, cv2.COLOR_BGR2RGB)
-                            )
-                    
-                    self.parent.recorder_results.emit(
-                        {
-                            'classification': classification,
-                            'confidence': confidence,
-                            'image_path': self.image_path
-                        }
-                    )
-                    
-                    self.doCaptureValue = False
-        self.cap.release()
-        cv2.destroyAllWindows()
\ No newline at end of file
+                with timings.span('retrieve'):
+                    ret, frame = self.source.retrieve()
+                if ret:
+                    self.frames.put(frame)
+            elif self.source.finished:
+                print(f'{self.source} finished')
+                break
+
+        print('Dropped frames: ' + ', '.join(f'{k} {v}' for k, v in self.dropped().items()))
+        self.pipeline.stop()
+        self.source.release()
+        self.isOpened = False
+        self.state = self.STOPPED
+        cv2.destroyAllWindows()
@@ -0,0 +1,232 @@
+from Config import settings
+import glob
+import os
+import time
+import cv2
+
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+class FrameSource:
+    '''
+        Where the recorder gets its BGR frames from.
+
+            source = open_source('./recordings/field-01.mp4', realtime=False)
+            if source.open():
+                ret, frame = source.read()
+            source.release()
+
+        `read()` returns (False, None) for a frame that could not be read;
+        `finished` becomes True once a recording is exhausted (never for a camera).
+        `grab()` moves to the next frame and `retrieve()` decodes it, a camera
+        is drained with grab() alone when its frames are not needed.
+
+        :param realtime: replay at the recording's frame rate, otherwise as fast as possible
+        :param loop: start over at the end of a recording (soak tests)
+    '''
+    name = 'source'
+    finished = False
+    live = False # a camera streams on its own (and is configured), a recording advances when read
+
+    def __init__(self, realtime:bool=True, loop:bool=False) -> None:
+        self.realtime = realtime
+        self.loop = loop
+        self.fps = settings.sequence_fps
+        self._next = None
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.name})'
+
+    def open(self) -> bool:
+        raise NotImplementedError
+
+    def isOpened(self) -> bool:
+        raise NotImplementedError
+
+    def read(self) -> tuple:
+        raise NotImplementedError
+
+    def grab(self) -> bool:
+        self._grabbed = self.read()
+        return self._grabbed[0]
+
+    def retrieve(self) -> tuple:
+        return self._grabbed
+
+    def resume(self) -> None:
+        ''' Called when frames are wanted again after a pause '''
+        pass
+
+    def release(self) -> None:
+        pass
+
+    def pace(self) -> None:
+        ''' Waits until the next frame is due when replaying in real time '''
+        if not self.realtime or not self.fps:
+            return
+        now = time.monotonic()
+        if self._next is None or now - self._next > 1.0: # first frame, or resumed after a pause
+            self._next = now
+        elif self._next > now:
+            time.sleep(self._next - now)
+        self._next += 1.0 / self.fps
+
+
+class CameraSource(FrameSource):
+    '''
+        A live camera, paced by the device itself.
+
+        The capture format (settings.camera_resolution, camera_fourcc,
+        camera_buffer_size) is requested when it opens. `dropped` counts the
+        frames the device skipped, from the gaps between frame timestamps
+        (stays 0 with drivers that report none).
+    '''
+    live = True
+
+    def __init__(self, index:int=0, realtime:bool=False, loop:bool=False) -> None:
+        super().__init__(realtime=realtime, loop=loop)
+        self.index = index # or anything else cv2.VideoCapture opens
+        self.name = f'camera {index}'
+        self.cap = None
+        self.dropped = 0
+        self._timestamp = None
+
+    def open(self) -> bool:
+        self.release()
+        self.cap = cv2.VideoCapture(self.index)
+        if self.live and self.cap.isOpened():
+            self.configure()
+        return self.cap.isOpened()
+
+    def configure(self) -> None:
+        if settings.camera_buffer_size is not None:
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, settings.camera_buffer_size)
+        if settings.camera_fourcc is not None:
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*settings.camera_fourcc))
+        if settings.camera_resolution is not None:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, settings.camera_resolution[0])
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, settings.camera_resolution[1])
+
+        # what the driver accepted
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 0
+        fourcc = int(self.cap.get(cv2.CAP_PROP_FOURCC)).to_bytes(4, 'little').decode('ascii', 'replace')
+        width, height = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        print(f'{self}: {width}x{height} {fourcc} at {self.fps:g} FPS')
+        self.dropped = 0
+        self._timestamp = None
+
+    def isOpened(self) -> bool:
+        return self.cap is not None and self.cap.isOpened()
+
+    def read(self) -> tuple:
+        return self.cap.read()
+
+    def grab(self) -> bool:
+        ok = self.cap.grab()
+        if ok and self.fps:
+            self.count_dropped(self.cap.get(cv2.CAP_PROP_POS_MSEC))
+        return ok
+
+    def retrieve(self) -> tuple:
+        return self.cap.retrieve()
+
+    def resume(self) -> None:
+        # the frames queued by the driver during the pause are stale, and the pause is no drop
+        for _ in range(settings.camera_buffer_size or 1):
+            self.cap.grab()
+        self._timestamp = None
+
+    def count_dropped(self, timestamp:float) -> None:
+        ''' Frames missing between the previous timestamp (ms) and this one '''
+        if timestamp <= 0:
+            return
+        if self._timestamp is not None:
+            missing = round((timestamp - self._timestamp) * self.fps / 1000) - 1
+            if missing > 0:
+                self.dropped += missing
+        self._timestamp = timestamp
+
+    def release(self) -> None:
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class VideoFileSource(CameraSource):
+    ''' A recorded video, replayed at the frame rate stored in the file '''
+    live = False
+
+    def __init__(self, path:str, realtime:bool=True, loop:bool=False) -> None:
+        super().__init__(path, realtime=realtime, loop=loop)
+        self.name = path
+
+    # paced and looped by read()
+    grab = FrameSource.grab
+    retrieve = FrameSource.retrieve
+    resume = FrameSource.resume
+
+    def open(self) -> bool:
+        if not super().open():
+            return False
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or settings.sequence_fps
+        self.finished = False
+        return True
+
+    def read(self) -> tuple:
+        self.pace()
+        ret, frame = self.cap.read()
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        self.finished = not ret
+        return ret, frame
+
+
+class ImageSequenceSource(FrameSource):
+    ''' The images of a directory in name order, at settings.sequence_fps '''
+
+    def __init__(self, directory:str, realtime:bool=True, loop:bool=False, fps:float=settings.sequence_fps) -> None:
+        super().__init__(realtime=realtime, loop=loop)
+        self.directory = directory
+        self.name = directory
+        self.fps = fps
+        self.paths = []
+        self.position = 0
+
+    def open(self) -> bool:
+        self.paths = sorted(
+            path for path in glob.glob(os.path.join(self.directory, '*'))
+            if path.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        self.position = 0
+        self.finished = False
+        return len(self.paths) > 0
+
+    def isOpened(self) -> bool:
+        return len(self.paths) > 0
+
+    def read(self) -> tuple:
+        if self.position >= len(self.paths):
+            if not self.loop:
+                self.finished = True
+                return False, None
+            self.position = 0
+
+        self.pace()
+        frame:np.ndarray = cv2.imread(self.paths[self.position], cv2.IMREAD_COLOR)
+        self.position += 1
+        return frame is not None, frame
+
+    def release(self) -> None:
+        self.paths = []
+
+
+def open_source(spec, realtime:bool=True, loop:bool=False) -> FrameSource:
+    ''' Camera index (int or digits), image directory or video file '''
+    if isinstance(spec, int) or str(spec).isdigit():
+        return CameraSource(int(spec))
+    if os.path.isdir(spec):
+        return ImageSequenceSource(spec, realtime=realtime, loop=loop)
+    return VideoFileSource(spec, realtime=realtime, loop=loop)
@@ -0,0 +1,192 @@
+from Config import settings
+from Utils.timing import registry as timings
+from .frame import Frame, BGR
+import json
+import os
+import queue
+import re
+import threading
+
+import cv2
+
+ENCODE_PARAMS = {
+    '.jpg': [cv2.IMWRITE_JPEG_QUALITY, settings.image_quality],
+    '.jpeg': [cv2.IMWRITE_JPEG_QUALITY, settings.image_quality],
+    '.png': [cv2.IMWRITE_PNG_COMPRESSION, settings.png_compression],
+    '.webp': [cv2.IMWRITE_WEBP_QUALITY, settings.image_quality],
+}
+
+
+class FileCounter:
+    '''
+        Next free `<project>/<class>/<imageName><n><extension>` without listing the folder.
+
+        The last number of every class is kept in `<project>/settings.Dev.counters_file`;
+        a class without one (projects from before the counter) is scanned once.
+    '''
+
+    def __init__(self, project_path:str) -> None:
+        self.project_path = project_path
+        self.file = os.path.join(project_path, settings.Dev.counters_file)
+        self.dirty = False
+        self._lock = threading.Lock()
+        try:
+            with open(self.file, 'r') as f:
+                self.counters:dict = json.load(f)
+        except (OSError, ValueError):
+            self.counters = {}
+
+    def next_path(self, classification:str, extension:str=settings.f_extension) -> str:
+        folder = os.path.join(self.project_path, classification)
+        with self._lock:
+            if classification not in self.counters:
+                os.makedirs(folder, exist_ok=True)
+                self.counters[classification] = self.scan(folder)
+            while True:
+                self.counters[classification] += 1
+                path = f'{folder}/{settings.imageName}{self.counters[classification]}{extension}'
+                # the saved counter can be behind after a crash
+                if not os.path.exists(path):
+                    self.dirty = True
+                    return path
+
+    @staticmethod
+    def scan(folder:str) -> int:
+        pattern = re.compile(rf'^{re.escape(settings.imageName)}(\d+)\.\w+$')
+        numbers = [int(m.group(1)) for m in map(pattern.match, os.listdir(folder)) if m]
+        return max(numbers, default=0)
+
+    def save(self) -> None:
+        with self._lock:
+            if not self.dirty:
+                return
+            counters, self.dirty = dict(self.counters), False
+        tmp = f'{self.file}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(counters, f, indent=4)
+        os.replace(tmp, self.file)
+
+
+class ImageWriter:
+    '''
+        Encodes and writes captures on a background thread.
+
+            path = writer.submit(project_path, classification, frame, roi=zoom, done=on_written)
+
+        A `roi` (x, y, width, height) of the frame is saved enlarged to the
+        frame's size, as the zoomed preview shows it. The path is allocated
+        immediately (FileCounter), `done(path)` is called
+        on the writer thread once the file is complete on disk, with the next
+        free path if another process took that one meanwhile. Files are
+        fsynced by batches of `fsync_batch`, or as soon as the queue runs empty.
+        At most `max_pending` images wait to be written: submit() blocks beyond
+        that, and `backlog(pending)` is called whenever the number changes so the
+        UI can hold captures back.
+    '''
+    STOP = object()
+
+    def __init__(self, max_pending:int=settings.writer_queue_size, fsync_batch:int=settings.writer_fsync_batch, backlog=None) -> None:
+        self.max_pending = max_pending
+        self.fsync_batch = fsync_batch
+        self.backlog = backlog
+        self.counters = {} # project path -> FileCounter
+        self.written = 0
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name='image writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.unfinished_tasks
+
+    def counter(self, project_path:str) -> FileCounter:
+        if project_path not in self.counters:
+            self.counters[project_path] = FileCounter(project_path)
+        return self.counters[project_path]
+
+    def submit(self, project_path:str, classification:str, frame:Frame, roi:tuple=None, done=None) -> str:
+        counter = self.counter(project_path)
+        path = counter.next_path(classification)
+        self._queue.put((counter, classification, path, frame, roi, done))
+        self._report()
+        return path
+
+    def flush(self) -> None:
+        ''' Blocks until every submitted image is written and synced '''
+        self._queue.join()
+
+    def close(self, timeout=None) -> None:
+        self._queue.put(self.STOP)
+        self._thread.join(timeout)
+
+    def _report(self) -> None:
+        if self.backlog is not None:
+            self.backlog(self.pending)
+
+    def _write(self, path:str, frame:Frame, roi:tuple=None):
+        image = frame.as_order(BGR)
+        if roi is not None:
+            x, y, w, h = roi
+            image = cv2.resize(image[y:y+h, x:x+w], (image.shape[1], image.shape[0]))
+
+        extension = os.path.splitext(path)[1].lower()
+        ok, encoded = cv2.imencode(extension, image, ENCODE_PARAMS.get(extension, []))
+        if not ok:
+            raise ValueError(f'cannot encode {path}')
+        os.makedirs(os.path.dirname(path), exist_ok=True) # the class folder may have been deleted since
+        f = open(path, 'xb') # never overwrites a capture
+        f.write(encoded)
+        f.flush()
+        return f
+
+    def _sync(self, files:list, counters:set) -> None:
+        with timings.span('fsync'):
+            for f in files:
+                os.fsync(f.fileno())
+                f.close()
+        for counter in counters:
+            counter.save()
+        for _ in files:
+            self._queue.task_done()
+        files.clear()
+        counters.clear()
+        self._report()
+
+    def _run(self) -> None:
+        files, counters = [], set()
+        while True:
+            try:
+                item = self._queue.get(block=not files)
+            except queue.Empty:
+                self._sync(files, counters) # idle: nothing is left unsynced
+                continue
+
+            if item is self.STOP:
+                self._sync(files, counters)
+                self._queue.task_done()
+                return
+
+            counter, classification, path, frame, roi, done = item
+            try:
+                with timings.span('write'):
+                    while True:
+                        try:
+                            files.append(self._write(path, frame, roi))
+                            break
+                        except FileExistsError:
+                            path = counter.next_path(classification) # e.g. written by classify.py
+                counters.add(counter)
+                self.written += 1
+            except (OSError, ValueError) as e:
+                print(f'Cannot save {path}: {e}')
+                self._queue.task_done()
+                continue
+
+            if done is not None:
+                try:
+                    done(path)
+                except Exception as e:
+                    print(f'{path} written, but: {e!r}')
+            if len(files) >= self.fsync_batch:
+                self._sync(files, counters)
@@ -1,5 +1,4 @@
 from PyQt5 import QtCore
-from Utils.utils import AppStyle
 
 #                    W I N D O W                    #
 # Main window size
@@ -14,11 +13,11 @@ ANALYTICS_HEIGHT = 420
 WINDOW_TITLE = 'SimbiSU'
 TOOLBAR_TITLE = 'ToolBar'
 
-# Styles:
+# Styles (QStyleFactory keys, applied by main.py):
 #   windows
 #   fusion
 #   windowsvista
-appStyle = AppStyle.fusion
+appStyle = 'fusion'
 
 
 #                    C A M E R A                    #
@@ -39,14 +38,103 @@ camera_scale = (
 IMAGE_SIZE = (224, 224) # from tensor model
 IMAGE_SHAPE = (224, 224, 3)
 
-# Output file name
+# Camera calibration (chessboard images and the cached result)
+calibration_images = './calibration/*.jpg'
+calibration_file = './calibration/calibration.npz'
+
+# Inference backend:
+#   keras           ./models/keras_model.h5
+#   tflite          float TensorFlow Lite export of the trainer notebook
+#   tflite-int8     quantized TensorFlow Lite export
+inference_backend = 'keras'
+inference_threads = 2 # tflite interpreter threads
+keras_model_path = './models/keras_model.h5'
+tflite_model_path = './models/model.tflite'
+tflite_int8_model_path = './models/model_int8.tflite'
+
+# Dummy inferences run in the background after the model is loaded (None to skip)
+warmup_runs = 3
+
+# Micro-batching of inference requests (Camera.inference.InferenceService)
+max_batch_size = 8
+max_batch_latency = 0.005 # seconds a request may wait for others to join its batch
+
+# Foreground extraction of captures (Camera.foreground_extraction):
+#   grabcut     GrabCut on a downscaled crop around the selection, boundary refined at full resolution
+#   threshold   leaf-green HSV threshold inside the selection, for plain backgrounds
+foreground_mode = 'grabcut'
+grabcut_iterations = 5
+grabcut_work_size = 480 # longest side of the crop GrabCut is solved on
+grabcut_min_scale = 0.5 # larger crops are not shrunk below this (the mask falls apart further down)
+grabcut_margin = 0.1 # of the selection, added on each side of the crop
+grabcut_refine = True
+grabcut_incremental = True # seed each capture from the previous one (same background)
+grabcut_incremental_iterations = 2
+leaf_hsv_lower = (20, 40, 40) # OpenCV HSV, hue in [0, 180): yellow to green
+leaf_hsv_upper = (90, 255, 255)
+
+# Camera capture format, requested from the driver when the camera is opened (None keeps the driver's):
+#   resolution   (width, height)
+#   fourcc       compressed MJPG lets USB 2.0 cameras deliver their full frame rate
+#   buffer_size  frames the driver may queue; the recorder drains it and keeps only the newest
+camera_resolution = (640, 480)
+camera_fourcc = 'MJPG'
+camera_buffer_size = 1
+
+# Camera discovery (Camera.discovery): seconds between listings, which notice cameras
+# plugged in or out (None lists once), and how long startup waits for the first one
+camera_discovery_interval = 2.0
+camera_discovery_timeout = 1.0
+
+# Seconds between attempts to open the camera, doubled after each failure up to the max
+camera_retry_delay = 0.5
+camera_retry_max_delay = 8.0
+# Failed grabs in a row after which a camera is considered lost (unplugged) and opened again
+camera_grab_failures = 10
+
+# Frame rate of image-sequence replays (Camera.sources), videos use their own
+sequence_fps = 30
+
+# Output file name and format: .jpg, .png or .webp
 imageName = 'capture'
 f_extension = '.jpg'
+image_quality = 95 # JPEG and WebP
+png_compression = 3 # 0 (fastest) to 9 (smallest)
 
 default_image_preview = './default-placeholder.png'
 
+# Image previews (analytics table & last capture)
+thumbnail_size = 70
+thumbnail_quality = 85
+thumbnail_memory_items = 1024
+
+
+#                  P I P E L I N E                  #
+# Bounded queues between the recorder stages
+#   frames:   grabber -> preprocessing, the oldest frame is dropped when full (keep small so the preview never lags)
+#   captures: preprocessing -> inference, waits when full: captures are never dropped
+#   results:  inference -> persistence, idem
+frame_queue_size = 1
+capture_queue_size = 4
+result_queue_size = 8
+
+# Background image writer (Camera.writer): captures waiting to be written before
+# the capture button is held back, and files written between two fsyncs
+writer_queue_size = 8
+writer_fsync_batch = 8
+
+# Per-stage latency (Utils.timing): rolling window of samples per stage,
+# FPS / p50 / p95 overlay on the preview, and the file the histograms are written to
+# on exit, in the project folder (None to skip, main.py --timings writes it anyway)
+timing_window = 240
+timing_overlay = False
+timing_file = None
+
 
 #>_>_>_>_>_>_>_>_>_>_>_>_DEV: P R O J E C T  F I L E>_>_>_>_>_>_>_>_>_>_>_>_#
 class Dev:
     pref_file = 'user-preferences.json'
-    analytics_file = 'analytics.json'
\ No newline at end of file
+    analytics_file = 'analytics.json' # legacy, migrated to analytics_log on open
+    analytics_log = 'analytics.jsonl'
+    counters_file = 'counters.json' # last file number of every class
+    thumbnails_dir = '.thumbnails' # cached previews (Utils.thumbnails)
\ No newline at end of file
@@ -0,0 +1,66 @@
+import threading
+import time
+
+# name -> seconds spent creating it, used by `main.py --startup-time`
+timings = {}
+
+
+class Lazy:
+    '''
+        Holds an expensive resource (model, calibration, ...) that is created by
+        `factory` on first `get()`, or ahead of time on a background thread with
+        `warm_up()`. Concurrent callers wait for the same single creation.
+    '''
+
+    def __init__(self, name:str, factory) -> None:
+        self.name = name
+        self.factory = factory
+        self._value = None
+        self._error = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    @property
+    def error(self) -> Exception:
+        return self._error
+
+    def get(self):
+        if self._ready.is_set():
+            return self._raise_or_value()
+
+        with self._lock:
+            if not self._ready.is_set():
+                start = time.perf_counter()
+                try:
+                    self._value = self.factory()
+                except Exception as e:
+                    self._error = e
+                timings[self.name] = time.perf_counter() - start
+                self._ready.set()
+        return self._raise_or_value()
+
+    def _raise_or_value(self):
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def warm_up(self, done=None) -> threading.Thread:
+        ''' :param done: called with this Lazy from the background thread once created '''
+        def target():
+            try:
+                self.get()
+            except Exception as e:
+                print(f'Failed to load {self.name}: {e}')
+            if done is not None:
+                done(self)
+
+        thread = threading.Thread(target=target, name=f'warm-up {self.name}', daemon=True)
+        thread.start()
+        return thread
+
+    def wait(self, timeout=None) -> bool:
+        return self._ready.wait(timeout)
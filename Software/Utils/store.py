@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+
+
+class AnalyticsLog:
+    '''
+        Append-only JSON-lines storage of a project's analytics.
+
+            line 1:  {"record": "project", "user": .., "title": .., "created": .., "is_project": true}
+            line n:  {"record": "image", "id": .., "path": .., "classification": .., ...}
+
+        Every append is a single flushed and fsynced line, so adding an image
+        costs O(1) whatever the size of the project. A last line torn by a crash
+        (no newline) is dropped and cut from the file the next time the log is
+        read; other malformed lines are skipped and reported, never cut.
+    '''
+    PROJECT = 'project'
+    IMAGE = 'image'
+
+    def __init__(self, path:str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.path)
+
+    def create(self, header:dict, images:list=()) -> None:
+        ''' Writes a new log (atomically, replacing any existing one) '''
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self._line({**header, 'record': self.PROJECT}))
+            for image in images:
+                f.write(self._line({**image, 'record': self.IMAGE}))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def append(self, image:dict) -> None:
+        line = self._line({**image, 'record': self.IMAGE})
+        with self._lock, open(self.path, 'a') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def header(self) -> dict:
+        ''' The project header alone (first line), without reading the images '''
+        with self._lock, open(self.path, 'rb') as f:
+            line = f.readline()
+        try:
+            record:dict = json.loads(line)
+        except ValueError:
+            return {}
+        return record if record.pop('record', None) == self.PROJECT else {}
+
+    def read(self) -> tuple:
+        ''' :returns: (project header, list of image records) '''
+        header, images = {}, []
+        offset, malformed, torn = 0, [], False
+        with self._lock:
+            with open(self.path, 'rb') as f: # read-only project folders can still be viewed
+                for number, line in enumerate(f, start=1):
+                    if not line.endswith(b'\n'):
+                        # only the last line can lack its newline: torn by a crash while appending
+                        torn = True
+                        break
+                    offset += len(line)
+
+                    try:
+                        record:dict = json.loads(line)
+                    except ValueError:
+                        malformed.append(number)
+                        continue
+
+                    kind = record.pop('record', self.IMAGE)
+                    if kind == self.PROJECT:
+                        header = record
+                    else:
+                        images.append(record)
+
+            if torn:
+                print(f'{self.path}: dropping a torn record at byte {offset}')
+                try:
+                    with open(self.path, 'rb+') as f:
+                        f.truncate(offset)
+                except OSError as e:
+                    print(f'{self.path}: cannot cut it, {e}')
+
+        if malformed:
+            print(f'{self.path}: skipped malformed record(s) on line(s) {", ".join(map(str, malformed))}')
+        return header, images
+
+    @staticmethod
+    def _line(record:dict) -> str:
+        return json.dumps(record, separators=(',', ':')) + '\n'
+
+    @staticmethod
+    def migrate(json_path:str, log_path:str) -> 'AnalyticsLog':
+        ''' Imports an `analytics.json` project file, which is kept as `<name>.migrated` '''
+        with open(json_path, 'r') as f:
+            data:dict = json.load(f)
+
+        header = {k: data[k] for k in ('user', 'title', 'created', 'is_project') if k in data}
+        log = AnalyticsLog(log_path)
+        log.create(header, data.get('images', []))
+        os.replace(json_path, f'{json_path}.migrated')
+        return log
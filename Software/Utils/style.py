@@ -22,7 +22,7 @@ table = '''
         background: white;
     }
 
-    QTableWidget::item:selected {
+    QTableView::item:selected {
         border: 1px solid %s;
         background-color: rgba(255, 255, 255, 128);
     }
@@ -0,0 +1,98 @@
+from PyQt5 import QtGui, QtCore
+from Config import settings
+import collections
+import hashlib
+import os
+
+
+class ThumbnailLoader(QtCore.QRunnable):
+    ''' Loads one thumbnail from the disk cache, or decodes the image at reduced size and caches it '''
+
+    def __init__(self, cache:'ThumbnailCache', path:str, cache_file:str) -> None:
+        super().__init__()
+        self.cache = cache
+        self.path = path
+        self.cache_file = cache_file
+
+    def run(self) -> None:
+        image = QtGui.QImage(self.cache_file) if os.path.isfile(self.cache_file) else QtGui.QImage()
+
+        if image.isNull():
+            reader = QtGui.QImageReader(self.path)
+            size = reader.size()
+            if size.isValid():
+                # lets the JPEG decoder skip most of the full resolution work
+                reader.setScaledSize(size.scaled(self.cache.size, self.cache.size, QtCore.Qt.KeepAspectRatio))
+            image = reader.read()
+
+            if not image.isNull():
+                os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+                image.save(self.cache_file, 'JPG', settings.thumbnail_quality)
+
+        self.cache.loaded.emit(self.path, image)
+
+
+class ThumbnailCache(QtCore.QObject):
+    '''
+        Thumbnails of captured images.
+
+        Stored per project in `<project>/settings.Dev.thumbnails_dir`, keyed by
+        path and modification time, generated on a background thread pool and
+        kept in an in-memory LRU. `get()` never decodes on the calling thread,
+        it returns None and emits `ready(path)` once the thumbnail is available.
+    '''
+    ready = QtCore.pyqtSignal(str)
+    loaded = QtCore.pyqtSignal(str, QtGui.QImage)
+
+    def __init__(self, size:int=settings.thumbnail_size, memory_items:int=settings.thumbnail_memory_items) -> None:
+        super().__init__()
+        self.size = size
+        self.memory_items = memory_items
+        self._pixmaps = collections.OrderedDict()
+        self._pending = set()
+        self.pool = QtCore.QThreadPool(self)
+        self.loaded.connect(self._onLoaded)
+
+    def get(self, path:str) -> QtGui.QPixmap:
+        pixmap = self._pixmaps.get(path)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(path)
+            return pixmap
+
+        if path not in self._pending:
+            cache_file = self.cache_file(path)
+            if cache_file is not None:
+                self._pending.add(path)
+                self.pool.start(ThumbnailLoader(self, path, cache_file))
+        return None
+
+    @staticmethod
+    def cache_file(path:str) -> str:
+        ''' <project>/<class>/<image> -> <project>/<thumbnails_dir>/<sha1 of path and mtime>.jpg '''
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        project = os.path.dirname(os.path.dirname(os.path.abspath(path)))
+        key = hashlib.sha1(f'{os.path.abspath(path)}:{mtime}'.encode()).hexdigest()
+        return os.path.join(project, settings.Dev.thumbnails_dir, f'{key}.jpg')
+
+    def _onLoaded(self, path:str, image:QtGui.QImage) -> None:
+        # QPixmap can only be created on the GUI thread
+        self._pending.discard(path)
+        if image.isNull():
+            return
+        self._pixmaps[path] = QtGui.QPixmap.fromImage(image)
+        if len(self._pixmaps) > self.memory_items:
+            self._pixmaps.popitem(last=False)
+        self.ready.emit(path)
+
+
+_instance:ThumbnailCache = None
+
+def cache() -> ThumbnailCache:
+    ''' Shared by every widget, created on first use (after the QApplication) '''
+    global _instance
+    if _instance is None:
+        _instance = ThumbnailCache()
+    return _instance
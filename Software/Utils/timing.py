@@ -0,0 +1,112 @@
+from Config import settings
+import collections
+import contextlib
+import json
+import math
+import threading
+import time
+
+
+class Timings:
+    '''
+        Registry of named latencies measured with the monotonic clock.
+
+        Each name keeps its last `window` samples for rolling percentiles and
+        an all-time histogram with power-of-two millisecond buckets (0.125 ms,
+        0.25 ms, ... ), cheap enough to stay enabled on every frame.
+
+            with registry.span('sharpen'):
+                ...
+    '''
+
+    def __init__(self, window:int=settings.timing_window) -> None:
+        self.window = window
+        self._samples = collections.defaultdict(lambda: collections.deque(maxlen=self.window))
+        self._histograms = collections.defaultdict(collections.Counter)
+        self._ticks = collections.defaultdict(lambda: collections.deque(maxlen=self.window))
+        self._tick_counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name:str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name:str, seconds:float) -> None:
+        bucket = max(-10, math.ceil(math.log2(seconds * 1000))) if seconds > 0 else -10
+        with self._lock:
+            self._samples[name].append(seconds)
+            self._histograms[name][bucket] += 1
+
+    def tick(self, name:str='frame') -> None:
+        ''' Marks one occurrence of `name`, see fps() '''
+        now = time.perf_counter()
+        with self._lock:
+            self._ticks[name].append(now)
+            self._tick_counts[name] += 1
+
+    def count(self, name:str='frame') -> int:
+        ''' Number of ticks of `name` since start '''
+        with self._lock:
+            return self._tick_counts.get(name, 0)
+
+    def fps(self, name:str='frame') -> float:
+        with self._lock:
+            ticks = list(self._ticks.get(name, ()))
+        if len(ticks) < 2:
+            return 0.0
+        # only the last second counts, a paused preview drops to 0
+        now = time.perf_counter()
+        recent = [t for t in ticks if now - t <= 1.0]
+        if len(recent) < 2:
+            return 0.0
+        return (len(recent) - 1) / (recent[-1] - recent[0])
+
+    def percentile(self, name:str, q:float) -> float:
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))]
+
+    def names(self) -> list:
+        with self._lock:
+            return list(self._samples)
+
+    def summary(self) -> dict:
+        ''' name -> {count, p50, p95, max} in milliseconds over the rolling window '''
+        result = {}
+        for name in self.names():
+            with self._lock:
+                samples = list(self._samples[name])
+                count = sum(self._histograms[name].values())
+            result[name] = {
+                'count': count,
+                'p50': self.percentile(name, 50) * 1000,
+                'p95': self.percentile(name, 95) * 1000,
+                'max': max(samples) * 1000,
+            }
+        return result
+
+    def overlay_text(self) -> str:
+        lines = [f'{self.fps():.1f} FPS']
+        for name, s in self.summary().items():
+            lines.append(f'{name:<11} p50 {s["p50"]:6.2f}  p95 {s["p95"]:6.2f} ms')
+        return '\n'.join(lines)
+
+    def dump(self, path:str) -> None:
+        ''' Writes the summary and the all-time histograms ("<= bucket ms": count) as JSON '''
+        with self._lock:
+            histograms = {
+                name: {f'{2.0 ** b:g}': n for b, n in sorted(counter.items())}
+                for name, counter in self._histograms.items()
+            }
+        with open(path, 'w') as f:
+            json.dump({'summary': self.summary(), 'histograms_ms': histograms}, f, indent=4)
+
+
+# Shared by the recorder stages and the UI overlay
+registry = Timings()
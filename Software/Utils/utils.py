@@ -1,8 +1,9 @@
-from PyQt5 import QtWidgets
 from Config import settings
+from Utils.store import AnalyticsLog
 from dataclasses import dataclass
 import json
 import datetime
+import getpass
 import os
 import pathlib
 import uuid
@@ -67,8 +68,8 @@ class Project:
     @staticmethod
     def mkNewProject(path:str) -> dict:
         ''' Initialize new project (create Folders & analytics) '''
-        os.makedirs(f'{path}/{settings.b_sigatoka}', exist_ok=True)
-        os.makedirs(f'{path}/{settings.y_sigatoka}', exist_ok=True)
+        for cls in settings.class_names:
+            os.makedirs(f'{path}/{cls}', exist_ok=True)
         analytics_read = Analytics.create_file(path)
         return analytics_read
 
@@ -76,6 +77,11 @@ class Project:
     def is_project(path:str) -> bool:
         ''' Check if selected path is a subtype of this project '''
         try:
+            log = AnalyticsLog(f'{path}/{settings.Dev.analytics_log}')
+            if log.exists():
+                return log.header().get('is_project', False)
+
+            # projects created before the append-only log
             with open(f'{path}/{settings.Dev.analytics_file}', 'r') as openfile:
                 analytics:dict = json.load(openfile)
 
@@ -100,6 +106,22 @@ class Image:
     
 class Analytics:
     '''
+        Stored in the project as an append-only log (settings.Dev.analytics_log),
+        `data` is rebuilt from it once when the project is opened and then kept
+        up to date by add_image().
+
+        @stats {
+            count:                          type=int
+            confidence_sum:                 type=float
+            confidence_sq_sum:              sum of squared confidences - type=float
+            min_confidence:                 type=float
+            max_confidence:                 type=float
+            total_confidence:               average confidence - type=float
+            days: {
+                yyyy-mm-dd: {count, confidence_sum}
+            }
+        }
+
         :attr data: {
             user:                           desktop logged in username\n
             title:                          Analytics\n
@@ -119,15 +141,13 @@ class Analytics:
                 
             ]\n\n
 
-            black_sigatoka: {
-                count:                      type=int
-                total_confidence:           type=float
+            classes: {
+                <class name>: @stats        one per settings.class_names
             }\n\n
 
-            yellow_sigatoka: {
-                count:                      type=int
-                total_confidence:           type=float
-            }\n\n
+            black_sigatoka:                 @stats of settings.b_sigatoka\n
+            yellow_sigatoka:                @stats of settings.y_sigatoka\n
+            overall:                        @stats of every image\n
 
             image_count:                    type=int\n
             overall_confidence:               type=float\n
@@ -135,61 +155,142 @@ class Analytics:
         }
     '''
     data = {'title': 'Analytics'}
-    path = ''
+    _path = ''
+    _log:AnalyticsLog = None
 
     def __init__(self, path='') -> None:
         if path != '':
             self.path = path
-            with open(f'{self.path}/{settings.Dev.analytics_file}', 'r') as f:
-                self.data:dict = json.load(f)
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @path.setter
+    def path(self, path:str) -> None:
+        ''' Opens the project's log (importing a legacy analytics.json) and rebuilds the totals once '''
+        self._path = path
+        self._log = AnalyticsLog(f'{path}/{settings.Dev.analytics_log}')
+        legacy_file = f'{path}/{settings.Dev.analytics_file}'
+
+        if not self._log.exists():
+            if not os.path.isfile(legacy_file):
+                self._log = None
+                return
+            print(f'Migrating {legacy_file} to {settings.Dev.analytics_log}')
+            AnalyticsLog.migrate(legacy_file, self._log.path)
+
+        header, images = self._log.read()
+        self.data = Analytics.new_data(header)
+        for image in images:
+            self._accumulate(image)
 
     @staticmethod
-    def create_file(path:str) -> dict:
-        today = Analytics.get_clock()
+    def new_data(header:dict) -> dict:
+        classes = {cls: Analytics.new_stats() for cls in settings.class_names}
         data = {
-            'user': Analytics.user(),
-            'title': 'Analytics',
-            'created': today,
-            'modified': today,
+            'user': header.get('user', ''),
+            'title': header.get('title', 'Analytics'),
+            'created': header.get('created', ''),
+            'modified': header.get('created', ''),
             'images': [],
-            'black_sigatoka': {},
-            'yellow_sigatoka': {},
+            'classes': classes,
+            'overall': Analytics.new_stats(),
             'image_count': 0,
             'overall_confidence': 0.0,
 
-            'is_project': True
+            'is_project': header.get('is_project', True)
         }
-
-        json_object = json.dumps(data, indent=4)
-        with open(f'{path}/{settings.Dev.analytics_file}', "w") as outfile:
-            outfile.write(json_object)
+        # legacy keys (e.g. black_sigatoka) share the stats of their class
+        for cls, stats in classes.items():
+            data[Analytics.group_key(cls)] = stats
         return data
 
+    @staticmethod
+    def new_stats() -> dict:
+        return {
+            'count': 0,
+            'confidence_sum': 0.0,
+            'confidence_sq_sum': 0.0,
+            'min_confidence': None,
+            'max_confidence': None,
+            'total_confidence': None,
+            'days': {},
+        }
+
+    @staticmethod
+    def update_stats(stats:dict, confidence:float, day:str) -> None:
+        stats['count'] += 1
+        stats['confidence_sum'] += confidence
+        stats['confidence_sq_sum'] += confidence * confidence
+        stats['total_confidence'] = stats['confidence_sum'] / stats['count']
+        if stats['min_confidence'] is None or confidence < stats['min_confidence']:
+            stats['min_confidence'] = confidence
+        if stats['max_confidence'] is None or confidence > stats['max_confidence']:
+            stats['max_confidence'] = confidence
+
+        bucket = stats['days'].setdefault(day, {'count': 0, 'confidence_sum': 0.0})
+        bucket['count'] += 1
+        bucket['confidence_sum'] += confidence
+
+    @staticmethod
+    def create_file(path:str) -> dict:
+        today = Analytics.get_clock()
+        header = {
+            'user': Analytics.user(),
+            'title': 'Analytics',
+            'created': today,
+            'is_project': True
+        }
+        AnalyticsLog(f'{path}/{settings.Dev.analytics_log}').create(header)
+        return Analytics.new_data(header)
+
     def add_image(self, image:Image) -> None:
-        with open(f'{self.path}/{settings.Dev.analytics_file}', "r+") as outfile:
-            file_data:dict = json.load(outfile)
+        if self._log is None:
+            Analytics.create_file(self.path)
+            self.path = self.path
 
-            file_data['user'] = self.user()
-            file_data['modified'] = Analytics.get_clock()
-            file_data['images'].append(image.__dict__)
+        record = dict(image.__dict__)
+        self._log.append(record)
+        self._accumulate(record)
+        self.data['user'] = self.user()
 
-            black_sigatoka_images = self.groupImages(obj=file_data['images'], cls=settings.b_sigatoka)
-            file_data['black_sigatoka']['count'] = len(black_sigatoka_images)
-            file_data['black_sigatoka']['total_confidence'] = self.calculate_total_confidence(black_sigatoka_images)
+    @staticmethod
+    def add_image_to(path:str, image:Image) -> None:
+        ''' Records an image in the log of a project that is not the loaded one '''
+        AnalyticsLog(f'{path}/{settings.Dev.analytics_log}').append(dict(image.__dict__))
 
-            yellow_sigatoka_images = self.groupImages(obj=file_data['images'], cls=settings.y_sigatoka)
-            file_data['yellow_sigatoka']['count'] = len(yellow_sigatoka_images)
-            file_data['yellow_sigatoka']['total_confidence'] = self.calculate_total_confidence(yellow_sigatoka_images)
-            
-            file_data['image_count'] = len(file_data['images'])
-            file_data['overall_confidence'] = self.calculate_total_confidence(file_data['images'])
+    def _accumulate(self, image:dict) -> None:
+        ''' O(1) update of the aggregates with one more image '''
+        data = self.data
+        data['images'].append(image)
+        data['modified'] = image.get('created', data['modified'])
 
-            outfile.seek(0)
-            json.dump(file_data, outfile, indent=4)
-            outfile.truncate()
+        confidence = image.get('confidence', 0.0)
+        day = self.day(image.get('created', ''))
+
+        stats = data['classes'].get(image.get('classification'))
+        if stats is not None:
+            self.update_stats(stats, confidence, day)
+
+        self.update_stats(data['overall'], confidence, day)
+        data['image_count'] = data['overall']['count']
+        data['overall_confidence'] = data['overall']['total_confidence']
+
+    @staticmethod
+    def group_key(cls:str) -> str:
+        ''' :param cls: from settings.class_names, e.g. 'Black Sigatoka' -> 'black_sigatoka' '''
+        return cls.lower().replace(' ', '_')
+
+    @staticmethod
+    def day(clock:str) -> str:
+        ''' :param clock: from get_clock() -> yyyy-mm-dd '''
+        try:
+            _, month_day, year = clock.split(', ')[:3]
+            return datetime.datetime.strptime(f'{month_day} {year}', '%B %d %Y').strftime('%Y-%m-%d')
+        except ValueError:
+            return 'unknown'
 
-        self.data = file_data
-    
     @staticmethod
     def create_new_id() -> str:
         return str(uuid.uuid4())
@@ -198,26 +299,13 @@ class Analytics:
     def get_clock() -> str:
         return datetime.datetime.now().strftime(f'%A, %B %d, %Y, %#I:%M:%S %p')
     
-    def groupImages(self, obj:dict, cls:str) -> list:
-        ''' :param c: from settings.class_names '''
-        if cls not in settings.class_names:
-            return []
-        return [c for c in obj if c.get('classification') == cls]
-
-    def calculate_total_confidence(self, group:list) -> float:
-        sum = 0.0
-        n_group = len(group)
-        if n_group != 0:
-            for obj in group:
-                sum += obj.get('confidence')
-            return sum / len(group)
-        return sum
-
-
     # Get data from analytics
     @staticmethod
     def user() -> str:
-        return os.getlogin()
+        try:
+            return os.getlogin()
+        except OSError: # no controlling terminal (scheduled / headless runs)
+            return getpass.getuser()
 
     def title(self) -> str:
         return self.data['title']
@@ -231,25 +319,31 @@ class Analytics:
     def images(self) -> list:
         return self.data['images']
 
+    def class_stats(self, cls:str) -> dict:
+        ''' :param cls: from settings.class_names '''
+        return self.data['classes'][cls]
+
     def black_sigatoka(self) -> dict:
-        return self.data['black_sigatoka']
+        return self.class_stats(settings.b_sigatoka)
 
     def yellow_sigatoka(self) -> dict:
-        return self.data['yellow_sigatoka']
+        return self.class_stats(settings.y_sigatoka)
 
     def image_count(self) -> int:
         return self.data['image_count']
 
     def overall_confidence(self) -> float:
         return self.data['overall_confidence']
+
+    def confidence_stddev(self, cls:str=None) -> float:
+        ''' Population standard deviation, of one class or of every image '''
+        stats = self.data['overall'] if cls is None else self.class_stats(cls)
+        n = stats['count']
+        if n == 0:
+            return 0.0
+        mean = stats['confidence_sum'] / n
+        return max(stats['confidence_sq_sum'] / n - mean * mean, 0.0) ** 0.5
     
     def get_latest_image(self) -> dict:
-        return self.images()[-1]
-
-
-class AppStyle:
-    windowsvista = QtWidgets.QStyleFactory.create('windowsvista')
-
-    windows = QtWidgets.QStyleFactory.create('windows')
-
-    fusion = QtWidgets.QStyleFactory.create('fusion')
+        images = self.data.get('images')
+        return images[-1] if images else None
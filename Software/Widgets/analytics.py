@@ -1,6 +1,6 @@
 from PyQt5 import QtWidgets, QtGui, QtCore, QtChart
 from Widgets.imagePreview import PreviewImage
-from Utils import style
+from Utils import style, thumbnails
 from Config import settings
 
 class AnalyticsWindow(QtWidgets.QWidget):
@@ -11,8 +11,7 @@ class AnalyticsWindow(QtWidgets.QWidget):
     created = ''
     images = []
     image_count = 0
-    blacksig = {}
-    yellowsig = {}
+    classes = {}
     overall_confidence = 0.
 
     def __init__(self, data:dict):
@@ -23,9 +22,8 @@ class AnalyticsWindow(QtWidgets.QWidget):
         self.created = data['created']
         self.images = data['images']
         self.image_count = data['image_count']
-        self.blacksig = data['black_sigatoka']
-        self.yellowsig = data['yellow_sigatoka']
-        self.overall_confidence = data['overall_confidence']
+        self.classes = data['classes']
+        self.overall_confidence = data['overall_confidence'] or 0.
 
         # TITLE & DATE
         titleFrame = QtWidgets.QFrame()
@@ -66,30 +64,21 @@ class AnalyticsWindow(QtWidgets.QWidget):
         subTotalLayout.setContentsMargins(10, 0, 10, 0)
         subTotalFont = QtGui.QFont("Poppins Medium", pointSize=8, weight=60)
 
-        yellowSigatokaTotalLabel = QtWidgets.QLabel(settings.y_sigatoka)
-        yellowSigatokaTotalLabel.setFont(subTotalFont)
-        subTotalLayout.addWidget(yellowSigatokaTotalLabel, 0, 0, 1, 1)
-
-        if self.yellowsig.get('total_confidence') == None:
-            self.yellowSigatokaTotalConfidence = QtWidgets.QLabel('--')
-        else:
-            self.yellowSigatokaTotalConfidence = QtWidgets.QLabel('{:.2f}%'.format(self.yellowsig['total_confidence'] * 100))
-        self.yellowSigatokaTotalConfidence.setAlignment(QtCore.Qt.AlignCenter)
-        self.yellowSigatokaTotalConfidence.setFont(subTotalFont)
-        subTotalLayout.addWidget(self.yellowSigatokaTotalConfidence, 0, 1, 1, 3)
-
-
-        blackSigatokaTotalLabel = QtWidgets.QLabel(settings.b_sigatoka)
-        blackSigatokaTotalLabel.setFont(subTotalFont)
-        subTotalLayout.addWidget(blackSigatokaTotalLabel, 1, 0, 1, 1)
-
-        if self.blacksig.get('total_confidence') == None:
-            self.blackSigatokaTotalConfidence = QtWidgets.QLabel('--')
-        else:
-            self.blackSigatokaTotalConfidence = QtWidgets.QLabel('{:.2f}%'.format(self.blacksig['total_confidence'] * 100))
-        self.blackSigatokaTotalConfidence.setAlignment(QtCore.Qt.AlignCenter)
-        self.blackSigatokaTotalConfidence.setFont(subTotalFont)
-        subTotalLayout.addWidget(self.blackSigatokaTotalConfidence, 1, 1, 1, 3)
+        # one row per settings.class_names
+        self.totalConfidenceLabels = {}
+        for row, cls in enumerate(self.classes):
+            totalLabel = QtWidgets.QLabel(cls)
+            totalLabel.setFont(subTotalFont)
+            subTotalLayout.addWidget(totalLabel, row, 0, 1, 1)
+
+            if self.classes[cls].get('total_confidence') == None:
+                totalConfidence = QtWidgets.QLabel('--')
+            else:
+                totalConfidence = QtWidgets.QLabel('{:.2f}%'.format(self.classes[cls]['total_confidence'] * 100))
+            totalConfidence.setAlignment(QtCore.Qt.AlignCenter)
+            totalConfidence.setFont(subTotalFont)
+            subTotalLayout.addWidget(totalConfidence, row, 1, 1, 3)
+            self.totalConfidenceLabels[cls] = totalConfidence
 
         topleftLayout.addLayout(titleOverallLayout)
         topleftLayout.addLayout(subTotalLayout)
@@ -104,15 +93,8 @@ class AnalyticsWindow(QtWidgets.QWidget):
         pieTitle.setFont(QtGui.QFont("Poppins Medium", pointSize=10, weight=60))
 
         self.pieSeries = QtChart.QPieSeries()
-        if self.yellowsig.get('count') == None:
-            self.pieSeries.append('Y', 0)
-        else:
-            self.pieSeries.append('Y', self.yellowsig['count'])
-
-        if self.blacksig.get('count') == None:
-            self.pieSeries.append('B', 0)
-        else:
-            self.pieSeries.append('B', self.blacksig['count'])
+        for cls, stats in self.classes.items():
+            self.pieSeries.append(cls[0], stats.get('count') or 0)
         self.pieSeries.setHoleSize(0.40)
         # pieSeries.setFont(QtGui.QFont("Poppins Medium", pointSize=7, weight=60))
 
@@ -153,6 +135,37 @@ class AnalyticsWindow(QtWidgets.QWidget):
         rightFrameLayout = QtWidgets.QVBoxLayout(rightFrame)
 
         self.table = ImagesResultTable(images=self.images)
+
+        # Filters
+        filterLayout = QtWidgets.QHBoxLayout()
+        filterFont = QtGui.QFont("Poppins Medium", pointSize=8, weight=60)
+
+        self.classFilter = QtWidgets.QComboBox()
+        self.classFilter.setFont(filterFont)
+        self.classFilter.addItem('All classes', None)
+        for cls in settings.class_names:
+            self.classFilter.addItem(cls, cls)
+        filterLayout.addWidget(self.classFilter)
+
+        self.dayFilter = QtWidgets.QComboBox()
+        self.dayFilter.setFont(filterFont)
+        self.dayFilter.addItem('All days', None)
+        for day in sorted(data.get('overall', {}).get('days', {}), reverse=True):
+            self.dayFilter.addItem(day, day)
+        filterLayout.addWidget(self.dayFilter)
+
+        self.confidenceFilter = QtWidgets.QSpinBox()
+        self.confidenceFilter.setFont(filterFont)
+        self.confidenceFilter.setRange(0, 100)
+        self.confidenceFilter.setPrefix('>= ')
+        self.confidenceFilter.setSuffix('%')
+        filterLayout.addWidget(self.confidenceFilter)
+
+        self.classFilter.currentIndexChanged.connect(self.applyFilter)
+        self.dayFilter.currentIndexChanged.connect(self.applyFilter)
+        self.confidenceFilter.valueChanged.connect(self.applyFilter)
+
+        rightFrameLayout.addLayout(filterLayout)
         rightFrameLayout.addWidget(self.table)
 
 
@@ -171,6 +184,13 @@ class AnalyticsWindow(QtWidgets.QWidget):
         qr.moveCenter(cp)
         self.move(qr.topLeft())
 
+    def applyFilter(self, *_):
+        self.table.model().setFilter(
+            classification = self.classFilter.currentData(),
+            min_confidence = self.confidenceFilter.value() / 100,
+            day = self.dayFilter.currentData()
+        )
+
 
 class AlignDelegate(QtWidgets.QStyledItemDelegate): # Table.cell.alignCenter 
     def initStyleOption(self, option, index):
@@ -179,19 +199,133 @@ class AlignDelegate(QtWidgets.QStyledItemDelegate): # Table.cell.alignCenter
 
 
 
-class ImagesResultTable(QtWidgets.QTableWidget):
+class ImagesResultModel(QtCore.QAbstractTableModel):
+    '''
+        Read-only model over the analytics images. Rows are only references
+        (indexes into `images`) and are handed to the view in chunks through
+        canFetchMore()/fetchMore(), cells are formatted when they are painted.
+    '''
     COLUMNS = ['Image', 'Classification', 'Confidence']
+    FETCH_SIZE = 256
+
+    TOOLTIP = """
+        <ul style='margin: 0px; padding: 0px; list-style: none;'> 
+            <li style='margin-bottom: 0.5em;'> <b>id:</b> {id}</li> 
+            <li style='margin-bottom: 0.5em;'> <b>path:</b> {path}</li> 
+            <li style='margin-bottom: 0.5em;'> <b>tensor_shape:</b> {width} x {height}</li> 
+            <li style='margin-bottom: 0.5em;'> <b>created:</b> {created}</li> 
+        </ul> 
+    """
+
+    def __init__(self, images:list, parent=None):
+        super().__init__(parent)
+        # keys: ['id', 'path', 'classification', 'confidence', 'tensor_shape', 'type', 'created', 'modified']
+        self.images:list[dict] = images
+        self.rows = list(range(len(images))) # filtered & sorted indexes into images
+        self.loaded = 0
+        self.sort_column, self.sort_order = 0, QtCore.Qt.AscendingOrder
+        thumbnails.cache().ready.connect(self.thumbnailReady)
+
+    def image(self, row:int) -> dict:
+        return self.images[self.rows[row]]
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and self.loaded < len(self.rows)
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        count = min(self.FETCH_SIZE, len(self.rows) - self.loaded)
+        self.beginInsertRows(QtCore.QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        image = self.image(index.row())
+        column = index.column()
+
+        if role == QtCore.Qt.DisplayRole:
+            if column == 0:
+                return str(self.rows[index.row()] + 1)
+            if column == 1:
+                return image['classification']
+            return '{:.2f}'.format(image['confidence']*100)
+
+        if role == QtCore.Qt.DecorationRole and column == 0:
+            return thumbnails.cache().get(image['path'])
+
+        if role == QtCore.Qt.ToolTipRole and column == 0:
+            return self.TOOLTIP.format(
+                id=image['id'],
+                path=image['path'],
+                width=image['tensor_shape'][0],
+                height=image['tensor_shape'][1],
+                created=image['created']
+            )
+        return None
+
+    def thumbnailReady(self, path:str):
+        # only the visible rows are actually repainted
+        if self.loaded:
+            self.dataChanged.emit(self.index(0, 0), self.index(self.loaded - 1, 0), [QtCore.Qt.DecorationRole])
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        ''' Image numbers follow capture order, so column 0 sorts by date '''
+        self.sort_column, self.sort_order = column, order
+        self.layoutAboutToBeChanged.emit()
+        self._sortRows()
+        self.layoutChanged.emit()
+
+    def _sortRows(self):
+        images = self.images
+        key = {
+            0: None,
+            1: lambda i: images[i]['classification'],
+            2: lambda i: images[i]['confidence'],
+        }[self.sort_column]
+        self.rows.sort(key=key, reverse=self.sort_order == QtCore.Qt.DescendingOrder)
+
+    def setFilter(self, classification:str=None, min_confidence:float=0.0, day:str=None):
+        ''' :param day: yyyy-mm-dd, as in Analytics.day() '''
+        self.beginResetModel()
+        # compare against the "Month dd, YYYY" part of get_clock() instead of parsing every date
+        created = None
+        if day is not None:
+            created = QtCore.QDate.fromString(day, 'yyyy-MM-dd').toString('MMMM dd, yyyy')
+
+        self.rows = [
+            i for i, image in enumerate(self.images)
+            if (classification is None or image['classification'] == classification)
+            and image['confidence'] >= min_confidence
+            and (created is None or ', '.join(image['created'].split(', ')[1:3]) == created)
+        ]
+        self._sortRows()
+        self.loaded = 0
+        self.endResetModel()
+
+
+class ImagesResultTable(QtWidgets.QTableView):
     selected_item = () # row, column
 
     def __init__(self, images:list):
         super().__init__()
-
-        # keys: ['id', 'path', 'classification', 'confidence', 'shape', 'type', 'created', 'modified']
-        self.images:list[dict] = images
+        self.setModel(ImagesResultModel(images, parent=self))
 
         self.setGeometry(QtCore.QRect(10, 27, 432, 251))
         self.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
-        self.horizontalHeader().setSortIndicatorShown(False)
+        self.setSortingEnabled(True)
+        self.sortByColumn(0, QtCore.Qt.AscendingOrder)
 
         font = QtGui.QFont("Poppins", pointSize=9, weight=50)
         self.setFont(font)
@@ -203,14 +337,12 @@ class ImagesResultTable(QtWidgets.QTableWidget):
         self.horizontalHeader().setStyleSheet('QHeaderView::section { border: none; border-bottom: 2px solid green;}')
         self.setStyleSheet(style.table)
         self.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollPerPixel)
-        self.cellClicked.connect(self.cell_item_clicked)
+        self.clicked.connect(self.cell_item_clicked)
 
         self.setAutoScroll(True)
         self.setAlternatingRowColors(True)
-        self.setColumnCount(len(self.COLUMNS))
-        self.setRowCount(0)
+        self.setIconSize(QtCore.QSize(40, 40))
         self.setupColumns()
-        self.loadRows(images=self.images)
 
         # Item Context Menu
         self.contextMenu = QtWidgets.QMenu(self)
@@ -218,49 +350,18 @@ class ImagesResultTable(QtWidgets.QTableWidget):
         self.defisheye = self.contextMenu.addAction("Path")
         self.stopRecorder = self.contextMenu.addAction("Date created")
 
-    def cell_item_clicked(self, row, column):
-        self.selected_item = (row, column)
+    def cell_item_clicked(self, index:QtCore.QModelIndex):
+        self.selected_item = (index.row(), index.column())
 
-        if column == 0:
-            self.second_ui = PreviewImage(QtGui.QPixmap(self.images[row]['path']))
-        # print("Row %d and Column %d was clicked" % (row, column))
-    
+        if index.column() == 0:
+            self.second_ui = PreviewImage(QtGui.QPixmap(self.model().image(index.row())['path']))
 
     def setupColumns(self):
         font = QtGui.QFont("Poppins Medium", pointSize=7, weight=75)
-        for i, c in enumerate(self.COLUMNS):
-            item = QtWidgets.QTableWidgetItem(c)
-            item.setFont(font)
-            self.setHorizontalHeaderItem(i, item)
+        self.horizontalHeader().setFont(font)
+        for i in range(self.model().columnCount()):
             self.horizontalHeader().setSectionResizeMode(i, QtWidgets.QHeaderView.Stretch)
             self.setItemDelegateForColumn(i, AlignDelegate(self))
+        # fixed row heights, the view never has to measure rows it has not shown
+        self.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
         self.verticalHeader().setDefaultSectionSize(44)
-    
-    def loadRows(self, images:list):
-        images:list[dict] = images
-        row_count = len(images)
-        self.setRowCount(row_count)
-
-        for row in range(row_count):
-            print(images[row]['path'])
-            image = QtWidgets.QTableWidgetItem(str(row+1))
-            image.setToolTip(
-            """
-                <ul style='margin: 0px; padding: 0px; list-style: none;'> 
-                    <li style='margin-bottom: 0.5em;'> <b>id:</b> {id}</li> 
-                    <li style='margin-bottom: 0.5em;'> <b>path:</b> {path}</li> 
-                    <li style='margin-bottom: 0.5em;'> <b>tensor_shape:</b> {width} x {height}</li> 
-                    <li style='margin-bottom: 0.5em;'> <b>created:</b> {created}</li> 
-                </ul> 
-            """.format(
-                    id=images[row]['id'],
-                    path=images[row]['path'],
-                    width=images[row]['tensor_shape'][0],
-                    height=images[row]['tensor_shape'][1],
-                    created=images[row]['created']
-                )
-            )
- 
-            self.setItem(row, 0, image)
-            self.setItem(row, 1, QtWidgets.QTableWidgetItem(images[row]['classification']))
-            self.setItem(row, 2, QtWidgets.QTableWidgetItem('{:.2f}'.format(images[row]['confidence']*100)))
\ No newline at end of file
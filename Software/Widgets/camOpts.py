@@ -1,19 +1,23 @@
 from PyQt5 import QtWidgets, QtCore
-from pygrabber.dshow_graph import FilterGraph
+from Camera import discovery
 
 
 class CamOptions(QtWidgets.QWidget):
-    camUsed = QtCore.pyqtSignal(int)
+    camUsed = QtCore.pyqtSignal(int) # cv2.VideoCapture index
 
-    def __init__(self, devices:list):
+    def __init__(self, devices:dict, current:int=None):
+        ''' :param devices: index -> name, as listed by Camera.discovery '''
         super().__init__()
+        self.indices = list(devices)
         vbox = QtWidgets.QVBoxLayout(self)
 
         self.name = QtWidgets.QLabel('Choose camera')
         vbox.addWidget(self.name)
 
         self.comboBox = QtWidgets.QComboBox()
-        self.comboBox.addItems(devices)
+        self.comboBox.addItems(list(devices.values()))
+        if current in self.indices:
+            self.comboBox.setCurrentIndex(self.indices.index(current))
         self.comboBox.currentIndexChanged.connect(self.on_combobox_changed)
         vbox.addWidget(self.comboBox)
 
@@ -27,14 +31,9 @@ class CamOptions(QtWidgets.QWidget):
         self.move(qr.topLeft())
     
     def on_combobox_changed(self, index):
-        self.camUsed.emit(index)
+        self.camUsed.emit(self.indices[index])
     
     @staticmethod
     def get_available_cameras():
-        devices = FilterGraph().get_input_devices()
-        available_cameras = {}
-
-        for device_index, device_name in enumerate(devices):
-            available_cameras[device_index] = device_name
-
-        return available_cameras
+        ''' Blocking, the app uses the cached list of Root.cameras (Camera.discovery.CameraDiscovery) '''
+        return discovery.list_cameras()
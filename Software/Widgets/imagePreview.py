@@ -1,4 +1,5 @@
 from PyQt5 import QtWidgets, QtGui, QtCore
+from Utils import thumbnails
 from Config import settings
 
 class ImagePreviewWidget(QtWidgets.QLabel):
@@ -14,19 +15,20 @@ class ImagePreviewWidget(QtWidgets.QLabel):
             self.imagePath = imagePath
 
         self.setAlignment(QtCore.Qt.AlignCenter)
+        thumbnails.cache().ready.connect(self.thumbnailReady)
         self.updateImage(self.imagePath)
         self.setFixedSize(self.WIDTH, self.HEIGHT)
     
     def updateImage(self, imagePath:str):
-        self.setPixmap(
-            QtGui.QPixmap(imagePath).scaled(
-                self.WIDTH,
-                self.HEIGHT, 
-                QtCore.Qt.KeepAspectRatio, 
-                transformMode=QtCore.Qt.SmoothTransformation
-            )
-        )
+        # the previous image stays until the thumbnail has been loaded in the background
         self.imagePath = imagePath
+        pixmap = thumbnails.cache().get(imagePath)
+        if pixmap is not None:
+            self.setPixmap(pixmap)
+
+    def thumbnailReady(self, imagePath:str):
+        if imagePath == self.imagePath:
+            self.setPixmap(thumbnails.cache().get(imagePath))
     
     def mousePressEvent(self, ev: QtGui.QMouseEvent) -> None:
         self.clicked.emit()
@@ -2,9 +2,9 @@ from PyQt5 import QtWidgets, QtGui, QtCore
 from Widgets.imagePreview import ImagePreviewWidget, PreviewImage
 from Widgets.rect import ResizableRect
 from Camera.recorder import Recorder
-from Widgets.camOpts import CamOptions
 from Utils.utils import Analytics
 from Utils import style
+from Utils.timing import registry as timings
 from Config import settings
 
 
@@ -33,9 +33,13 @@ class UI(QtWidgets.QWidget):
         
         self.image_preview.updateImage(imagePath=image_path)
 
-    def __init__(self, parent, hasFolderSelected=False):
+    def __init__(self, parent, hasFolderSelected=False, source=None):
         super(UI, self).__init__()
-        self.availableCameras = CamOptions.get_available_cameras()
+        # listed in the background (Camera.discovery), the first listing is quick
+        self.availableCameras = parent.cameras.wait(settings.camera_discovery_timeout)
+        parent.cameras.changed.connect(self.on_cameras_changed)
+        self.cameraLost = False # the camera in use was unplugged and no other one is left
+        self.source = source # replayed recording (Camera.sources), None for the cameras
 
         self.scaleValue = 1
         self.recorder_results.connect(self.get_results)
@@ -72,7 +76,8 @@ class UI(QtWidgets.QWidget):
             onCenter = False
         )
 
-        if not(len(self.availableCameras) > 0 and hasFolderSelected):
+        hasSource = len(self.availableCameras) > 0 or self.source is not None
+        if not(hasSource and hasFolderSelected):
             self.videoCapture = QtWidgets.QLabel("Select a project directory, the camera should start.")
             self.videoCapture.resize(settings.camera_scale[0], settings.camera_scale[1])
             self.videoCapture.setAlignment(QtCore.Qt.AlignCenter)
@@ -85,6 +90,17 @@ class UI(QtWidgets.QWidget):
         self.scene.addItem(self.resizableRect)
         self.resizableRect.hide()
 
+        # FPS and per-stage latency drawn over the preview
+        self.timingsOverlay = QtWidgets.QGraphicsSimpleTextItem()
+        self.timingsOverlay.setFont(QtGui.QFont("Consolas", pointSize=8))
+        self.timingsOverlay.setBrush(QtGui.QBrush(QtCore.Qt.yellow))
+        self.timingsOverlay.setPos(6, 6)
+        self.timingsOverlay.setZValue(1)
+        self.scene.addItem(self.timingsOverlay)
+        self.timingsTimer = QtCore.QTimer(self)
+        self.timingsTimer.setInterval(500)
+        self.timingsTimer.timeout.connect(self.update_timings_overlay)
+
         self.topleft_layout.addWidget(self.view)
         topleft.setFrameShape(QtWidgets.QFrame.StyledPanel)
 
@@ -227,13 +243,14 @@ class UI(QtWidgets.QWidget):
 
         camera_layout_box.addLayout(controlsLayout)
 
-        # Capture
-        capture_button = QtWidgets.QPushButton("Capture")
+        # Capture (enabled once the model has been loaded)
+        self.capture_button = QtWidgets.QPushButton("Loading model ...")
+        self.capture_button.setEnabled(False)
         font.setPointSize(11)
-        capture_button.setFont(font)
-        capture_button.clicked.connect(self.capture)
+        self.capture_button.setFont(font)
+        self.capture_button.clicked.connect(self.capture)
 
-        camera_layout_box.addWidget(capture_button)
+        camera_layout_box.addWidget(self.capture_button)
 
 
         self.camera_group_box.setLayout(camera_layout_box)
@@ -259,14 +276,18 @@ class UI(QtWidgets.QWidget):
         # Start camera
         self.recorder = Recorder(
             parent = self,
-            selectedPath = self.parent.project.path
+            selectedPath = self.parent.project.path,
+            source = self.source
         )
         self.recorder.on_classify.connect(self.on_classify_emitted)
         self.recorder.changePixmap.connect(self.setImage)
-        if len(self.availableCameras) > 0 and hasFolderSelected:
-            self.camera_group_box.setEnabled(True)
-            self.parent.toolBar.actionCamera.setToolTip(self.availableCameras[0])
-            self.recorder.start()
+        self.recorder.status.connect(self.videoCapture.setText)
+        self.recorder.loaded.connect(self.on_recorder_loaded)
+        self.recorder.defisheyeUnavailable.connect(self.on_defisheye_unavailable)
+        self.recorder.backlog.connect(self.on_writer_backlog)
+        self.recorder.warmUp()
+        if hasSource and hasFolderSelected:
+            self.start_recorder()
 
         # Context Menu
         self.contextMenu = QtWidgets.QMenu(self)
@@ -274,12 +295,86 @@ class UI(QtWidgets.QWidget):
         self.defisheye = self.contextMenu.addAction("Defisheye")
         self.contextMenu.addSeparator()
         self.save_controls = self.contextMenu.addAction("Save controls")
+        self.contextMenu.addSeparator()
+        self.show_timings = self.contextMenu.addAction("Show timings")
         self.defisheye.setCheckable(True)
+        self.show_timings.setCheckable(True)
+        self.show_timings.setChecked(settings.timing_overlay)
+        self.set_timings_overlay(settings.timing_overlay)
 
         self.set_userpref_controls()
     
+    def start_recorder(self):
+        ''' On the replayed recording, or the first camera listed '''
+        if self.source is None and self.availableCameras:
+            self.recorder.selectedCameraIndex = next(iter(self.availableCameras))
+        self.camera_group_box.setEnabled(True)
+        self.parent.toolBar.actionCamera.setToolTip(
+            str(self.source or self.availableCameras.get(self.recorder.selectedCameraIndex, ''))
+        )
+        self.recorder.start()
+
+    def on_cameras_changed(self, cameras):
+        ''' A camera was plugged in or out '''
+        print(f'Cameras: {", ".join(cameras.values()) or "none"}')
+        self.availableCameras = cameras
+        if self.source is not None:
+            return
+        if not self.recorder.isRunning():
+            if cameras and self.parent.project.path != '':
+                self.videoCapture.setText('')
+                self.start_recorder()
+            return
+
+        index = self.recorder.selectedCameraIndex
+        if index not in cameras:
+            # the camera in use is gone: another one, or the same one again once it is back
+            index = next(iter(cameras), index)
+            self.cameraLost = index not in cameras
+            self.recorder.onCamSelectedIndex(index)
+            self.parent.toolBar.actionCamera.setToolTip(cameras.get(index, ''))
+        elif self.cameraLost:
+            # plugged back in, reopened now rather than at the next retry
+            self.cameraLost = False
+            self.recorder.onCamSelectedIndex(index)
+            self.parent.toolBar.actionCamera.setToolTip(cameras[index])
+
+    def on_recorder_loaded(self, name):
+        if name == self.recorder.calibrated_camera.name:
+            if self.recorder.calibrated_camera.error is not None:
+                # greyed out quietly, it was not asked for
+                self.on_defisheye_unavailable(str(self.recorder.calibrated_camera.error), notify=False)
+            return
+        if name != self.recorder.backend.name:
+            return
+        if self.recorder.backend.error is not None:
+            self.capture_button.setText("Model unavailable")
+        else:
+            self.capture_button.setText("Capture")
+            self.capture_button.setEnabled(True)
+
+    def on_defisheye_unavailable(self, error, notify=True):
+        ''' Without calibration data Defisheye cannot work, it is turned off and greyed out '''
+        if not self.defisheye.isEnabled():
+            return # already reported
+        self.defisheye.setChecked(False)
+        self.defisheye.setEnabled(False)
+        self.defisheye.setText("Defisheye (no calibration)")
+        self.defisheye.setToolTip(error)
+        if notify:
+            QtWidgets.QMessageBox.warning(self, "Defisheye unavailable", f"The camera calibration could not be loaded:\n{error}")
+
+    def on_writer_backlog(self, pending):
+        ''' Holds captures back while the image writer is full '''
+        if self.recorder.backend.error is not None or not self.recorder.backend.ready:
+            return
+        full = pending >= self.recorder.writer.max_pending
+        self.capture_button.setEnabled(not full)
+        self.capture_button.setText(f"Saving ({pending}) ..." if full else "Capture")
+        self.capture_button.setToolTip(f"{pending} capture(s) being saved" if pending else "")
+
     def on_classify_emitted(self, value):
-        self.analytics.add_image(image=self.recorder.image)
+        # the recorder's persistence stage already wrote the image to analytics
         self.on_classify_value = value
 
     def contextMenuEvent(self, event: QtGui.QContextMenuEvent) -> None:
@@ -303,12 +398,29 @@ class UI(QtWidgets.QWidget):
         elif action == self.setControlsToDefault:
             self.set_controls_to_default()
 
+        elif action == self.show_timings:
+            self.set_timings_overlay(self.show_timings.isChecked())
+
+    def set_timings_overlay(self, visible):
+        self.timingsOverlay.setVisible(visible)
+        if visible:
+            self.update_timings_overlay()
+            self.timingsTimer.start()
+        else:
+            self.timingsTimer.stop()
+
+    def update_timings_overlay(self):
+        dropped = ' '.join(f'{k} {v}' for k, v in self.recorder.dropped().items())
+        self.timingsOverlay.setText(f'{timings.overlay_text()}\ndropped     {dropped}')
+
     def capture(self):
         self.recorder.doCapture.emit(True)
 
     @QtCore.pyqtSlot(QtGui.QImage)
     def setImage(self, image):
+        # the image is the recorder's preview buffer, copied here before the next frame reuses it
         self.videoCapture.setPixmap(QtGui.QPixmap.fromImage(image))
+        self.recorder.previewDone()
     
     def set_brightness(self, value):
         self.recorder.brightness.emit(value)
@@ -378,6 +490,9 @@ class UI(QtWidgets.QWidget):
 
     def grabcut_bool(self, value):
         if value:
+            # a new series of captures, possibly on another background;
+            # the inference thread may be extracting, it resets before its next one
+            self.recorder.grabcut.request_reset()
             self.resizableRect.show()
         else:
             self.resizableRect.hide()
\ No newline at end of file
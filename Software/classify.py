@@ -0,0 +1,151 @@
+'''
+    Headless batch classification of archived images.
+
+    Usage (from ./Software):
+        python classify.py <directory or glob> --project <project directory> [--batch-size 32] [--workers 4]
+        python classify.py <directory or glob> --dry-run
+
+    Every image is classified with the configured model and copied into the
+    project's class folder, and its result is appended to the project's analytics.
+    With --dry-run the results are only printed and no project is needed.
+'''
+from concurrent.futures import ThreadPoolExecutor
+from Camera import inference
+from Camera.writer import FileCounter
+from Camera.frame import Frame
+from Utils.utils import Project, Analytics, Image
+from Config import settings
+import argparse
+import collections
+import glob
+import os
+import shutil
+import sys
+import time
+import numpy as np
+import cv2
+
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def find_images(source:str) -> list:
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(p for p in paths if p.lower().endswith(EXTENSIONS) and os.path.isfile(p))
+
+
+def decode(path:str) -> np.ndarray:
+    ''' Model input pixels: RGB, settings.IMAGE_SIZE, uint8 (cast into the batch buffer, as in the trainer notebook) '''
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    return inference.input_pixels(Frame(image))
+
+
+def decoded(paths:list, workers:int):
+    ''' Yields (path, array) in order, with at most 2 * workers images decoded ahead '''
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        window = collections.deque()
+        for path in paths:
+            window.append((path, pool.submit(decode, path)))
+            if len(window) >= 2 * workers:
+                path, future = window.popleft()
+                yield path, future.result()
+        while window:
+            path, future = window.popleft()
+            yield path, future.result()
+
+
+def batches(paths:list, batch_size:int, workers:int):
+    ''' Yields (paths, batch) with the batch buffer reused between calls '''
+    buffer = np.empty((batch_size, *settings.IMAGE_SHAPE), np.float32)
+    names = []
+    for path, array in decoded(paths, workers):
+        if array is None:
+            print(f'skipped (cannot decode): {path}')
+            continue
+        buffer[len(names)] = array
+        names.append(path)
+        if len(names) == batch_size:
+            yield names, buffer
+            names = []
+    if names:
+        yield names, buffer[:len(names)]
+
+
+class ProjectWriter:
+    ''' Copies classified images into a project's class folders and records them in its analytics '''
+
+    def __init__(self, project_path:str) -> None:
+        if not Project.is_project(project_path):
+            Project.mkNewProject(project_path)
+        self.project_path = project_path
+        self.analytics = Analytics(path=project_path)
+        self.counter = FileCounter(project_path) # shared with the recorder's numbering
+
+    def close(self) -> None:
+        self.counter.save()
+
+    def add(self, source:str, classification:str, confidence:float) -> Image:
+        path = self.counter.next_path(classification)
+        if source.lower().endswith(settings.f_extension):
+            shutil.copyfile(source, path)
+        else:
+            cv2.imwrite(path, cv2.imread(source, cv2.IMREAD_COLOR))
+
+        today = Analytics.get_clock()
+        image = Image(
+            id = Analytics.create_new_id(),
+            path = path,
+            classification = classification,
+            confidence = float(confidence),
+            tensor_shape = settings.IMAGE_SHAPE,
+            type = settings.f_extension,
+            created = today,
+            modified = today
+        )
+        self.analytics.add_image(image)
+        return image
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='directory of images or a glob, e.g. "./archive/**/*.jpg"')
+    parser.add_argument('--project', help='project directory receiving the results, required unless --dry-run')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='decoding threads')
+    parser.add_argument('--backend', choices=list(inference.BACKENDS), default=settings.inference_backend)
+    parser.add_argument('--dry-run', action='store_true', help='only print the results')
+    args = parser.parse_args()
+    if not args.dry_run and not args.project:
+        parser.error('--project is required unless --dry-run')
+
+    paths = find_images(args.source)
+    if not paths:
+        sys.exit(f'No images found in {args.source}')
+
+    backend = inference.load_backend(args.backend)
+    writer = None if args.dry_run else ProjectWriter(args.project)
+
+    start = time.perf_counter()
+    count = 0
+    for names, batch in batches(paths, args.batch_size, args.workers):
+        scores = inference.softmax(backend.predict(batch))
+        for path, score in zip(names, scores):
+            classification = settings.class_names[int(np.argmax(score))]
+            confidence = float(np.max(score))
+            if writer is not None:
+                writer.add(path, classification, confidence)
+            print(f'{classification:<16} {confidence*100:6.2f}%  {path}')
+        count += len(names)
+
+    if writer is not None:
+        writer.close()
+    elapsed = time.perf_counter() - start
+    print(f'{count} images in {elapsed:.1f} s ({count / max(elapsed, 1e-9):.1f} images/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,23 @@
+import time
+STARTED = time.perf_counter()
+
 from PyQt5 import QtWidgets, QtGui, QtCore
 from Widgets.toolBar import ToolBar
 from Widgets.camOpts import CamOptions
 from Widgets.analytics import AnalyticsWindow
 from Widgets.ui import UI
 from Utils.utils import Project, Analytics
+from Utils import lazy
+from Utils import timing
 from Config import settings
+from Camera import sources
+from Camera.discovery import CameraDiscovery
+import argparse
+import os
 import sys
-import time
+import threading
+
+IMPORTED = time.perf_counter()
 
 
 class Root(QtWidgets.QMainWindow):
@@ -15,14 +26,19 @@ class Root(QtWidgets.QMainWindow):
 
     selectedPath = ''
     availableCameras = {}
+    timing_file = settings.timing_file # stage timings written on exit
 
-    def __init__(self) -> None:
+    def __init__(self, source=None) -> None:
         super().__init__()
         hasFolderSelected = True
 
         self.project = Project()
         self.analytics = Analytics(path=self.project.path)
 
+        # listed in the background and kept up to date, so opening the camera list never stalls the preview
+        self.cameras = CameraDiscovery(parent=self)
+        self.cameras.start()
+
         self.centralwidget = QtWidgets.QWidget(self)
         self.mainLayout = QtWidgets.QVBoxLayout(self.centralwidget)
         self.mainLayout.setContentsMargins(0, 0, 0, 0)
@@ -44,7 +60,8 @@ class Root(QtWidgets.QMainWindow):
         
         self.ui = UI(
             parent = self,
-            hasFolderSelected = hasFolderSelected
+            hasFolderSelected = hasFolderSelected,
+            source = source
         )
         self.ui.analytics = self.analytics
 
@@ -80,17 +97,16 @@ class Root(QtWidgets.QMainWindow):
         # Create new or load project
         if self.project.path != '': 
             if not Project.is_project(self.project.path):
-                analytics_read = Project.mkNewProject(self.project.path)
-                self.analytics.path = self.project.path
-                self.analytics.data = analytics_read
+                Project.mkNewProject(self.project.path)
                 self.toolBar.update()
+            self.analytics.path = self.project.path
             self.toolBar.setFolderIconToNormal()
             self.toolBar.actionAnalytics.setEnabled(True)
             self.toolBar.actionCamera.setEnabled(True)
 
             if not self.ui.recorder.isRunning():
                 self.ui.videoCapture.setText('')
-                self.ui.recorder.start()
+                self.ui.start_recorder()
         
             self.toolBar.actionFolder.setToolTip(self.project.path)
             self.ui.recorder.projectPath.emit(self.project.path)
@@ -106,32 +122,77 @@ class Root(QtWidgets.QMainWindow):
     
     def selectCamera(self):
         ''' Camera'''
-        self.ui.recorder.pause.emit(True)
-        self.availableCameras = CamOptions.get_available_cameras()
-        self.ui.recorder.pause.emit(False)
+        # the cached list, the recorder keeps running
+        self.availableCameras = self.cameras.cameras
+        self.cameras.refresh()
 
-        if not self.ui.recorder.isRunning() and len(self.availableCameras) > 0:
-            self.ui.camera_group_box.setEnabled(True)
-            self.ui.recorder.start()
+        if not self.ui.recorder.isRunning() and (len(self.availableCameras) > 0 or self.ui.source is not None):
+            self.ui.start_recorder()
         else:
-            self.ui.recorder.pause.emit(True)
-            self.camOption = CamOptions(devices=list(self.availableCameras.values()))
+            self.camOption = CamOptions(devices=self.availableCameras, current=self.ui.recorder.selectedCameraIndex)
             self.camOption.camUsed.connect(self.ui.recorder.onCamSelectedIndex)
-            self.ui.recorder.pause.emit(False)
             self.toolBar.actionCamera.setToolTip(self.camOption.comboBox.currentText())
             self.camOption.show()
     
     def closeEvent(self, event: QtGui.QCloseEvent) -> None:
         if self.ui.recorder.isRunning():
-            self.ui.recorder.isOpened = False
             print('Closing ...')
-            time.sleep(2)
+            self.ui.recorder.stop()
+            self.ui.recorder.wait(5000) # ms, a camera read in progress finishes first
+
+        self.cameras.stop()
+
+        # captures still queued for writing
+        self.ui.recorder.writer.close(timeout=10)
+
+        if self.timing_file and timing.registry.names():
+            # with the project's captures, or the user's data folder when none is open
+            folder = self.project.path or QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.AppDataLocation)
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, self.timing_file)
+            timing.registry.dump(path)
+            print(f'Stage timings written to {path}')
+
+def report_startup(root:Root, shown:float):
+    ''' Prints where the startup time went once the background loads finished '''
+    recorder = root.ui.recorder
+    for resource in (recorder.backend, recorder.calibrated_camera):
+        resource.wait()
+
+    print('Startup time:')
+    print(f'    imports          {IMPORTED - STARTED:8.3f} s')
+    print(f'    window painted   {shown - IMPORTED:8.3f} s')
+    for name, seconds in lazy.timings.items():
+        print(f'    {name:<16} {seconds:8.3f} s (background)')
+
+    if recorder.backend.error is None:
+        print(f'Model {recorder.backend.get()} latency:')
+        for name, seconds in recorder.backend.get().latency.items():
+            print(f'    {name:<16} {seconds*1000:8.1f} ms')
 
 def main():
-    app = QtWidgets.QApplication(sys.argv)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--startup-time', action='store_true', help='print where the startup time went')
+    parser.add_argument('--source', help='replay a video file or a directory of images instead of the camera')
+    parser.add_argument('--fast', action='store_true', help='replay as fast as possible instead of in real time')
+    parser.add_argument('--loop', action='store_true', help='start the replay over at its end')
+    parser.add_argument('--timings', nargs='?', const='timings.json', metavar='FILE',
+                        help='write the stage timings to FILE (in the project folder) on exit')
+    args, qt_args = parser.parse_known_args()
+
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
     app.setStyle(settings.appStyle)
-    root = Root()
+    source = sources.open_source(args.source, realtime=not args.fast, loop=args.loop) if args.source else None
+    root = Root(source=source)
+    if args.timings:
+        root.timing_file = args.timings
     root.show()
+
+    if args.startup_time:
+        # runs once the first paint events have been processed
+        QtCore.QTimer.singleShot(0, lambda: threading.Thread(
+            target=report_startup, args=(root, time.perf_counter()), daemon=True
+        ).start())
     sys.exit(app.exec_())
 	
 if __name__ == '__main__':
@@ -0,0 +1,83 @@
+import os
+import sys
+import threading
+import pytest
+
+# the application imports its packages (Config, Camera, Utils ...) from ./Software
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FRAME_SHAPE = (480, 640, 3) # settings.camera_scale, as the JINJIEAN B19 delivers it
+
+
+class HeadlessUI:
+    ''' What the recorder stages read from Widgets.ui.UI, without widgets '''
+
+    class Checkbox:
+        def __init__(self, checked:bool) -> None:
+            self.checked = checked
+
+        def isChecked(self) -> bool:
+            return self.checked
+
+    class Rect:
+        def getRect(self) -> tuple:
+            from Config import settings
+            w, h = settings.camera_scale[:2]
+            return (w // 4, h // 4, w // 2, h // 2)
+
+    class Results:
+        ''' Stands in for UI.recorder_results, sets `event` on every result '''
+        def __init__(self) -> None:
+            self.event = threading.Event()
+
+        def emit(self, result:dict) -> None:
+            self.event.set()
+
+    def __init__(self, project_path:str, grabcut:bool=False) -> None:
+        from Utils.utils import Analytics
+        self.grabcut_checkbox = self.Checkbox(grabcut)
+        self.resizableRect = self.Rect()
+        self.analytics = Analytics(path=project_path)
+        self.recorder_results = self.Results()
+
+
+@pytest.fixture
+def frame_shape() -> tuple:
+    return FRAME_SHAPE
+
+
+@pytest.fixture
+def qt_app():
+    QtCore = pytest.importorskip('PyQt5.QtCore')
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+@pytest.fixture
+def project(tmp_path) -> str:
+    from Utils.utils import Project
+    Project.mkNewProject(str(tmp_path))
+    return str(tmp_path)
+
+
+@pytest.fixture
+def new_recorder(qt_app, project):
+    ''' Recorder(grabcut=False) on `project` with a headless UI, its workers closed after the test '''
+    pytest.importorskip('cv2')
+    from PyQt5 import QtCore
+    from Camera.recorder import Recorder
+    recorders = []
+
+    def create(grabcut:bool=False) -> Recorder:
+        recorder = Recorder(selectedPath=project)
+        recorder.parent = HeadlessUI(project, grabcut=grabcut)
+        # stands in for UI.setImage, which releases the preview buffer once shown
+        recorder.changePixmap.connect(lambda image: recorder.previewDone(), QtCore.Qt.DirectConnection)
+        # UI.set_controls_to_default()
+        recorder.brightnessValue, recorder.contrastValue, recorder.sharpnessValue = 0, 1.0, 0
+        recorders.append(recorder)
+        return recorder
+
+    yield create
+    for recorder in recorders:
+        recorder.service.close()
+        recorder.writer.close()
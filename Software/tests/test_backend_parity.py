@@ -0,0 +1,68 @@
+'''
+    The inference backends agree on the repo's test images: the TFLite exports
+    predict the class the Keras model predicts, with softmax scores within
+    TOLERANCE. Backends whose model file is not there are skipped.
+'''
+import glob
+import os
+import pytest
+
+np = pytest.importorskip('numpy')
+cv2 = pytest.importorskip('cv2')
+pytest.importorskip('tensorflow')
+
+from Camera import inference
+from Camera.frame import Frame
+from Config import settings
+
+SOFTWARE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOLERANCE = 0.02 # max absolute difference of softmax scores
+
+MODELS = {
+    'keras': lambda path: inference.KerasBackend(path),
+    'tflite': lambda path: inference.TFLiteBackend(path, settings.inference_threads),
+    'tflite-int8': lambda path: inference.TFLiteBackend(path, settings.inference_threads),
+}
+PATHS = {
+    'keras': settings.keras_model_path,
+    'tflite': settings.tflite_model_path,
+    'tflite-int8': settings.tflite_int8_model_path,
+}
+
+
+def load_backend(name:str) -> inference.Backend:
+    path = os.path.join(SOFTWARE, PATHS[name])
+    if not os.path.isfile(path):
+        pytest.skip(f'no {name} model at {path}')
+    return MODELS[name](path)
+
+
+@pytest.fixture(scope='module')
+def batch():
+    paths = sorted(glob.glob(os.path.join(SOFTWARE, 'testImages', '*.jpg')))
+    if not paths:
+        pytest.skip('no test images')
+    batch = np.empty((len(paths), *settings.IMAGE_SHAPE), np.float32)
+    prepare = inference.ModelInput()
+    for i, path in enumerate(paths):
+        # same layout the trainer used: RGB, resized to IMAGE_SIZE, values in [0, 255]
+        prepare(Frame(cv2.imread(path)), out=batch[i])
+    return batch
+
+
+@pytest.fixture(scope='module')
+def reference(batch):
+    return scores(load_backend('keras'), batch)
+
+
+def scores(backend:inference.Backend, batch) -> 'np.ndarray':
+    # one image per call, as the recorder classifies captures
+    return np.concatenate([inference.softmax(backend.predict(batch[i:i+1])) for i in range(len(batch))])
+
+
+@pytest.mark.parametrize('name', ['tflite', 'tflite-int8'])
+def test_backend_matches_keras(name, batch, reference):
+    predicted = scores(load_backend(name), batch)
+
+    assert (np.argmax(predicted, axis=-1) == np.argmax(reference, axis=-1)).all()
+    assert np.abs(predicted - reference).max() <= TOLERANCE
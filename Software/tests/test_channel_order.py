@@ -0,0 +1,60 @@
+'''
+    The model receives RGB inputs, as the trainer notebook did (keras load_img),
+    on both paths to it: the recorder (camera frames) and classify.py (image
+    files). No model, camera or display is needed.
+'''
+import os
+import pytest
+
+np = pytest.importorskip('numpy')
+cv2 = pytest.importorskip('cv2')
+pytest.importorskip('PyQt5')
+
+from Camera import inference
+from Config import settings
+import classify
+
+RED = (255, 0, 0) # as the model must see it
+
+
+class SpyBackend(inference.Backend):
+    ''' Keeps every batch it is given '''
+    name = 'spy'
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.batches = []
+
+    def predict(self, batch):
+        self.batches.append(batch.copy())
+        return np.zeros((len(batch), len(settings.class_names)), np.float32)
+
+
+def seen(model_input) -> tuple:
+    return tuple(int(round(v)) for v in model_input.reshape(-1, 3).mean(axis=0))
+
+
+@pytest.fixture
+def red_bgr(frame_shape):
+    image = np.zeros(frame_shape, np.uint8)
+    image[..., 2] = 255 # as a camera or cv2.imread delivers it
+    return image
+
+
+def test_recorder_input_is_rgb(new_recorder, red_bgr):
+    recorder = new_recorder()
+    spy = SpyBackend()
+    recorder.service.close()
+    recorder.service = inference.InferenceService(spy)
+
+    recorder.doCaptureValue = True
+    recorder.infer(recorder.preprocess(red_bgr))
+
+    assert seen(spy.batches[-1][0]) == RED
+
+
+def test_classify_decode_is_rgb(red_bgr, tmp_path):
+    path = os.path.join(str(tmp_path), 'red.png')
+    cv2.imwrite(path, red_bgr)
+
+    assert seen(classify.decode(path)) == RED
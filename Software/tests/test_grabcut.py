@@ -0,0 +1,88 @@
+'''
+    The GrabCut extractor stays close to the legacy full-resolution GrabCut
+    on the repo's test images, large crops are not shrunk below
+    GrabCut.min_scale and a reset asked from another thread waits for the
+    next extract. Only the 256x256 images are solved against the legacy
+    mask here, the full-size ones take minutes (python -m Benchmark.grabcut).
+'''
+import os
+import pytest
+
+np = pytest.importorskip('numpy')
+cv2 = pytest.importorskip('cv2')
+
+from Camera import foreground_extraction as forex
+
+SOFTWARE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# IoU against the legacy mask; the yellow leaf is ambiguous even for the legacy
+# GrabCut (about 0.70 IoU between two of its own runs with other seeds)
+FLOORS = {
+    'blacksigatokatest2.jpg': 0.9,
+    'yellowsigatokatest2.jpg': 0.6,
+}
+
+
+def legacy_grabcut(image, rect, iterations=5) -> np.ndarray:
+    ''' GrabCut.begin before the downscaled solve: the whole frame at full resolution '''
+    mask = np.zeros(image.shape[:2], np.uint8)
+    background_model = np.zeros((1, 65), np.float64)
+    foreground_model = np.zeros((1, 65), np.float64)
+    cv2.grabCut(image, mask, rect, background_model, foreground_model, iterations, cv2.GC_INIT_WITH_RECT)
+    return np.isin(mask, (cv2.GC_FGD, cv2.GC_PR_FGD))
+
+
+def iou(a:np.ndarray, b:np.ndarray) -> float:
+    union = np.count_nonzero(a | b)
+    return np.count_nonzero(a & b) / union if union else 1.0
+
+
+def selection(shape:tuple, side:float=0.8) -> tuple:
+    ''' Centered rectangle covering `side` of each side, as Benchmark.grabcut '''
+    h, w = shape[:2]
+    rw, rh = int(w * side), int(h * side)
+    return ((w - rw) // 2, (h - rh) // 2, rw, rh)
+
+
+@pytest.mark.parametrize('name', sorted(FLOORS))
+def test_matches_legacy(name):
+    image = cv2.imread(os.path.join(SOFTWARE, 'testImages', name), cv2.IMREAD_COLOR)
+    rect = selection(image.shape)
+
+    cv2.setRNGSeed(0)
+    reference = legacy_grabcut(image, rect)
+    cv2.setRNGSeed(0)
+    mask = forex.GrabCut(incremental=False).extract(image, rect) > 0
+
+    assert iou(mask, reference) >= FLOORS[name]
+
+
+def test_min_scale(monkeypatch):
+    solved = []
+    def solve(self, image, rect, seed=None):
+        solved.append(image.shape)
+        raise cv2.error('recorded') # falls back to the selection
+    monkeypatch.setattr(forex.GrabCut, 'solve', solve)
+
+    grabcut = forex.GrabCut(incremental=False)
+    image = np.zeros((2000, 4000, 3), np.uint8)
+    grabcut.extract(image, (0, 0, 4000, 2000))
+
+    assert max(solved[0][:2]) == int(4000 * grabcut.min_scale)
+
+
+def test_request_reset(monkeypatch):
+    previous = []
+    def solve(self, image, rect, seed=None):
+        previous.append(self.previous)
+        raise cv2.error('recorded')
+    monkeypatch.setattr(forex.GrabCut, 'solve', solve)
+
+    grabcut = forex.GrabCut(incremental=True)
+    grabcut.previous = np.full((100, 100), 255, np.uint8)
+    grabcut.request_reset() # as from the GUI thread: nothing changes until the next extract
+    assert grabcut.previous is not None
+
+    grabcut.extract(np.zeros((100, 100, 3), np.uint8), (10, 10, 80, 80))
+    assert previous == [None]
+    assert not grabcut.reset_requested